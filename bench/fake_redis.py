@@ -0,0 +1,124 @@
+"""
+Local stand-in for Redis covering the commands the shared cache uses.
+
+Speaks RESP over TCP and keeps everything in memory, so CACHE_BACKEND=redis
+can be exercised without a Redis install:
+
+    python -m bench.fake_redis --port 6380
+    CACHE_BACKEND=redis CACHE_URL=redis://127.0.0.1:6380/0
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+# key -> (value, expires_at or None)
+store = {}
+commands = Counter()
+
+
+def _live(key):
+    entry = store.get(key)
+    if entry is None:
+        return None
+    value, expires_at = entry
+    if expires_at is not None and expires_at <= time.monotonic():
+        del store[key]
+        return None
+    return value
+
+
+def _bulk(value):
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _set(args):
+    key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+    expires_at = None
+    nx = b"NX" in options
+    xx = b"XX" in options
+    for unit, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+        if unit in options:
+            amount = float(options[options.index(unit) + 1])
+            expires_at = time.monotonic() + amount * scale
+    exists = _live(key) is not None
+    if (nx and exists) or (xx and not exists):
+        return b"$-1\r\n"
+    store[key] = (value, expires_at)
+    return b"+OK\r\n"
+
+
+def handle(args):
+    name = args[0].upper().decode()
+    commands[name] += 1
+    if name == "PING":
+        return b"+PONG\r\n"
+    if name in ("AUTH", "SELECT"):
+        return b"+OK\r\n"
+    if name == "GET":
+        return _bulk(_live(args[1]))
+    if name == "SET":
+        return _set(args[1:])
+    if name == "DEL":
+        removed = sum(1 for key in args[1:] if store.pop(key, None) is not None)
+        return b":%d\r\n" % removed
+    if name == "EXISTS":
+        return b":%d\r\n" % sum(1 for key in args[1:] if _live(key) is not None)
+    if name == "DBSIZE":
+        return b":%d\r\n" % len(store)
+    if name == "FLUSHALL":
+        store.clear()
+        return b"+OK\r\n"
+    return b"-ERR unknown command '%s'\r\n" % name.encode()
+
+
+async def _read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, e.g. from `nc`.
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+async def serve_client(reader, writer):
+    try:
+        while True:
+            args = await _read_command(reader)
+            if args is None:
+                break
+            if args:
+                writer.write(handle(args))
+                await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int):
+    server = await asyncio.start_server(serve_client, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Local stand-ins for AeroDataBox, Brave Search and Groq.
+
+Replays the recorded responses in bench/fixtures with configurable latency and
+jitter, and counts every call so the load driver can report upstream usage.
+Point the API at it with:
+
+    AERODATABOX_URL=http://127.0.0.1:9000
+    BRAVE_API_URL=http://127.0.0.1:9000/res/v1/web/search
+    GROQ_ENDPOINT=http://127.0.0.1:9000/openai/v1/chat/completions
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import re
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+with open(os.path.join(FIXTURES, "aerodatabox_flight.json"), encoding="utf-8") as f:
+    FLIGHT_TEMPLATE = json.load(f)
+with open(os.path.join(FIXTURES, "brave_search.json"), encoding="utf-8") as f:
+    BRAVE_RESPONSE = json.load(f)
+with open(os.path.join(FIXTURES, "groq_completion.txt"), encoding="utf-8") as f:
+    COMPLETION_TOKENS = re.findall(r"\s*\S+", f.read().strip())
+
+# Latency settings in milliseconds, overridable from the command line.
+config = {
+    "aerodatabox_ms": float(os.getenv("FAKE_AERODATABOX_MS", "250")),
+    "brave_ms": float(os.getenv("FAKE_BRAVE_MS", "300")),
+    "groq_ttft_ms": float(os.getenv("FAKE_GROQ_TTFT_MS", "400")),
+    "groq_token_ms": float(os.getenv("FAKE_GROQ_TOKEN_MS", "15")),
+    # Fraction of completions whose first token is held back a further
+    # groq_stall_ms, to reproduce Groq's tail latency.
+    "groq_stall_rate": float(os.getenv("FAKE_GROQ_STALL_RATE", "0")),
+    "groq_stall_ms": float(os.getenv("FAKE_GROQ_STALL_MS", "5000")),
+    "jitter": float(os.getenv("FAKE_JITTER", "0.2")),
+}
+calls = Counter()
+
+app = FastAPI()
+
+
+async def _sleep(ms: float):
+    jitter = config["jitter"]
+    await asyncio.sleep(max(0.0, ms * random.uniform(1 - jitter, 1 + jitter)) / 1000)
+
+
+def _shift(time_field, days: int, minutes: int = 0):
+    shifted = {}
+    for key, fmt in (("utc", "%Y-%m-%d %H:%M"), ("local", "%Y-%m-%d %H:%M")):
+        value = time_field[key]
+        stamp, suffix = value[:16], value[16:]
+        moved = datetime.strptime(stamp, fmt) + timedelta(days=days, minutes=minutes)
+        shifted[key] = moved.strftime(fmt) + suffix
+    return shifted
+
+
+def _flight_for_day(flight_number: str, day: str):
+    """
+    Builds the recorded flight for another day. A stable hash of the flight
+    and day decides whether it ran on time, was delayed or was cancelled.
+    """
+    template_day = datetime.strptime(
+        FLIGHT_TEMPLATE["departure"]["scheduledTime"]["local"][:10], "%Y-%m-%d"
+    )
+    days = (datetime.strptime(day, "%Y-%m-%d") - template_day).days
+    roll = zlib.crc32(f"{flight_number}:{day}".encode()) % 10
+
+    flight = copy.deepcopy(FLIGHT_TEMPLATE)
+    flight["number"] = f"{flight_number[:2]} {flight_number[2:]}"
+    delay = 0 if roll >= 3 else 45 * roll + 30
+    for leg in ("departure", "arrival"):
+        times = flight[leg]
+        times["scheduledTime"] = _shift(times["scheduledTime"], days)
+        times["revisedTime"] = _shift(times["scheduledTime"], 0, delay)
+        times["runwayTime"] = _shift(times["scheduledTime"], 0, delay + 10)
+
+    if roll == 0:
+        flight["status"] = "Canceled"
+        for leg in ("departure", "arrival"):
+            flight[leg].pop("revisedTime")
+            flight[leg].pop("runwayTime")
+    return flight
+
+
+@app.get("/flights/number/{flight_number}/{start}/{end}")
+async def flights_between(flight_number: str, start: str, end: str):
+    calls["aerodatabox"] += 1
+    await _sleep(config["aerodatabox_ms"])
+    day = datetime.strptime(start, "%Y-%m-%d")
+    last = datetime.strptime(end, "%Y-%m-%d")
+    flights = []
+    while day <= last:
+        flights.append(_flight_for_day(flight_number, day.strftime("%Y-%m-%d")))
+        day += timedelta(days=1)
+    return JSONResponse(content=flights)
+
+
+@app.get("/flights/number/{flight_number}/{date}")
+async def flights_on_date(flight_number: str, date: str):
+    calls["aerodatabox"] += 1
+    await _sleep(config["aerodatabox_ms"])
+    return JSONResponse(content=[_flight_for_day(flight_number, date)])
+
+
+@app.get("/flights/airports/iata/{airport}")
+async def departures_board(airport: str):
+    # Twenty Delta departures scheduled today (UTC), in FIDS board shape.
+    calls["aerodatabox"] += 1
+    await _sleep(config["aerodatabox_ms"])
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    departures = []
+    for n in range(100, 120):
+        flight = _flight_for_day(f"DL{n}", today)
+        movement = dict(flight["departure"], airport=flight["arrival"]["airport"])
+        departures.append(
+            {
+                "movement": movement,
+                "number": flight["number"],
+                "status": flight["status"],
+                "airline": flight["airline"],
+            }
+        )
+    return JSONResponse(content={"departures": departures})
+
+
+@app.get("/res/v1/web/search")
+async def brave_search(q: str = "", count: int = 5):
+    calls["brave"] += 1
+    await _sleep(config["brave_ms"])
+    response = copy.deepcopy(BRAVE_RESPONSE)
+    response["query"]["original"] = q
+    response["web"]["results"] = response["web"]["results"][:count]
+    return JSONResponse(content=response)
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    calls["groq"] += 1
+    payload = await request.json()
+    calls[f"groq:{payload.get('model')}"] += 1
+
+    stalled = random.random() < config["groq_stall_rate"]
+
+    async def events():
+        await _sleep(config["groq_ttft_ms"])
+        if stalled:
+            await _sleep(config["groq_stall_ms"])
+        for i, token in enumerate(COMPLETION_TOKENS):
+            if i:
+                await _sleep(config["groq_token_ms"])
+            chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/_stats")
+async def stats():
+    return {"calls": dict(calls), "config": config}
+
+
+@app.post("/_reset")
+async def reset():
+    calls.clear()
+    return {"calls": {}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    for key, value in config.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=float, default=value)
+    args = parser.parse_args()
+    for key in config:
+        config[key] = getattr(args, key)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
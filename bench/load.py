@@ -0,0 +1,147 @@
+"""
+Load driver for the SkySettle API.
+
+Fires requests at /compensation, /cancellation-reason and /flight-stats at a
+fixed concurrency and reports latency percentiles, time to first byte,
+throughput and, when the fake upstreams are used, upstream call counts.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+ENDPOINTS = ("/compensation", "/cancellation-reason", "/flight-stats")
+
+
+def percentile(values, pct: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+async def _one_request(client, endpoint, flight_number, date):
+    started = time.perf_counter()
+    ttfb = None
+    async with client.stream(
+        "GET", endpoint, params={"flight_number": flight_number, "date": date}
+    ) as response:
+        async for _ in response.aiter_bytes():
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+    return response.status_code, time.perf_counter() - started, ttfb
+
+
+async def run_load(
+    base_url, endpoints, flights, dates, total_requests, concurrency, timeout=120
+):
+    results = defaultdict(lambda: {"latency": [], "ttfb": [], "errors": 0})
+    queue = asyncio.Queue()
+    for i in range(total_requests):
+        endpoint = endpoints[i % len(endpoints)]
+        queue.put_nowait((endpoint, random.choice(flights), random.choice(dates)))
+
+    async def worker(client):
+        while not queue.empty():
+            endpoint, flight_number, date = queue.get_nowait()
+            result = results[endpoint]
+            try:
+                status, latency, ttfb = await _one_request(
+                    client, endpoint, flight_number, date
+                )
+            except httpx.HTTPError:
+                result["errors"] += 1
+                continue
+            if status != 200:
+                result["errors"] += 1
+                continue
+            result["latency"].append(latency)
+            if ttfb is not None:
+                result["ttfb"].append(ttfb)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=timeout, limits=limits
+    ) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return results, elapsed
+
+
+async def upstream_calls(fake_url):
+    if not fake_url:
+        return None
+    async with httpx.AsyncClient(base_url=fake_url) as client:
+        response = await client.get("/_stats")
+        return response.json().get("calls", {})
+
+
+async def reset_upstream_calls(fake_url):
+    if fake_url:
+        async with httpx.AsyncClient(base_url=fake_url) as client:
+            await client.post("/_reset")
+
+
+def report(results, elapsed, calls=None):
+    total_ok = sum(len(r["latency"]) for r in results.values())
+    summary = {
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(total_ok / elapsed, 2) if elapsed else 0.0,
+        "endpoints": {},
+    }
+    for endpoint, result in sorted(results.items()):
+        latency_ms = [v * 1000 for v in result["latency"]]
+        ttfb_ms = [v * 1000 for v in result["ttfb"]]
+        summary["endpoints"][endpoint] = {
+            "ok": len(latency_ms),
+            "errors": result["errors"],
+            "p50_ms": round(percentile(latency_ms, 50), 1),
+            "p95_ms": round(percentile(latency_ms, 95), 1),
+            "p99_ms": round(percentile(latency_ms, 99), 1),
+            "ttfb_p50_ms": round(percentile(ttfb_ms, 50), 1),
+            "ttfb_p95_ms": round(percentile(ttfb_ms, 95), 1),
+        }
+    if calls is not None:
+        summary["upstream_calls"] = calls
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument(
+        "--fake-url",
+        default="http://127.0.0.1:9000",
+        help="Fake upstream server to read call counts from ('' to skip)",
+    )
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--flights", default="DL324")
+    parser.add_argument("--dates", default="2025-04-12")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    async def run():
+        await reset_upstream_calls(args.fake_url)
+        results, elapsed = await run_load(
+            args.base_url,
+            args.endpoints.split(","),
+            args.flights.split(","),
+            args.dates.split(","),
+            args.requests,
+            args.concurrency,
+        )
+        return report(results, elapsed, await upstream_calls(args.fake_url))
+
+    print(json.dumps(asyncio.run(run()), indent=4))
+
+
+if __name__ == "__main__":
+    main()
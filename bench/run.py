@@ -0,0 +1,143 @@
+"""
+Runs the offline benchmark end to end: starts the fake upstreams and the API
+pointed at them, drives load, prints the report and shuts everything down.
+
+    python -m bench.run --requests 500 --concurrency 50
+    python -m bench.run --workers 4 --cache-backend redis
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench.load import ENDPOINTS, report, reset_upstream_calls, run_load, upstream_calls
+
+
+def _wait_until_up(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--api-port", type=int, default=8001)
+    parser.add_argument("--fake-port", type=int, default=9001)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--flights", default="DL324,DL1102,AA100,UA901")
+    parser.add_argument("--dates", default="2025-04-12,2025-04-13")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--aerodatabox-ms", type=float, default=250)
+    parser.add_argument("--brave-ms", type=float, default=300)
+    parser.add_argument("--groq-ttft-ms", type=float, default=400)
+    parser.add_argument("--groq-token-ms", type=float, default=15)
+    parser.add_argument("--groq-stall-rate", type=float, default=0)
+    parser.add_argument("--groq-stall-ms", type=float, default=5000)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--cache-backend", choices=("memory", "sqlite", "redis"), default="memory"
+    )
+    parser.add_argument("--redis-port", type=int, default=6380)
+    args = parser.parse_args()
+
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    api_url = f"http://127.0.0.1:{args.api_port}"
+    env = dict(
+        os.environ,
+        AERODATABOX_URL=fake_url,
+        BRAVE_API_URL=f"{fake_url}/res/v1/web/search",
+        GROQ_ENDPOINT=f"{fake_url}/openai/v1/chat/completions",
+        CACHE_BACKEND=args.cache_backend,
+    )
+    scratch = tempfile.TemporaryDirectory()
+    # A fresh history store each run, so results don't depend on earlier runs.
+    env["FLIGHT_HISTORY_PATH"] = os.path.join(scratch.name, "flight_history.db")
+    cache = None
+    if args.cache_backend == "sqlite":
+        env["CACHE_URL"] = os.path.join(scratch.name, "cache.db")
+    elif args.cache_backend == "redis":
+        env["CACHE_URL"] = f"redis://127.0.0.1:{args.redis_port}/0"
+        cache = subprocess.Popen(
+            [sys.executable, "-m", "bench.fake_redis", "--port", str(args.redis_port)]
+        )
+
+    fake = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "bench.fake_upstreams",
+            "--port",
+            str(args.fake_port),
+            "--aerodatabox-ms",
+            str(args.aerodatabox_ms),
+            "--brave-ms",
+            str(args.brave_ms),
+            "--groq-ttft-ms",
+            str(args.groq_ttft_ms),
+            "--groq-token-ms",
+            str(args.groq_token_ms),
+            "--groq-stall-rate",
+            str(args.groq_stall_rate),
+            "--groq-stall-ms",
+            str(args.groq_stall_ms),
+            "--jitter",
+            str(args.jitter),
+        ],
+        env=env,
+    )
+    api = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "flight_assistant.main:app",
+            "--port",
+            str(args.api_port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+    try:
+        _wait_until_up(f"{fake_url}/_stats")
+        _wait_until_up(f"{api_url}/docs")
+
+        async def run():
+            await reset_upstream_calls(fake_url)
+            results, elapsed = await run_load(
+                api_url,
+                args.endpoints.split(","),
+                args.flights.split(","),
+                args.dates.split(","),
+                args.requests,
+                args.concurrency,
+            )
+            return report(results, elapsed, await upstream_calls(fake_url))
+
+        print(json.dumps(asyncio.run(run()), indent=4))
+    finally:
+        processes = [p for p in (api, fake, cache) if p is not None]
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
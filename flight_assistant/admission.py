@@ -0,0 +1,245 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+import httpx
+from fastapi.responses import StreamingResponse
+
+from flight_assistant import metrics
+from flight_assistant.scheduler import UpstreamBusy
+from flight_assistant.upstream import UpstreamError
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Concurrency limits never shrink more than once per this many seconds, so
+# one burst of slow completions counts as a single signal.
+DECREASE_INTERVAL = 1.0
+DECREASE_FACTOR = 0.75
+# Failures that point at overload here or upstream. Any other error (a bad
+# date, an unknown flight) frees its slot without moving the limit.
+CONGESTION_ERRORS = (asyncio.TimeoutError, httpx.HTTPError, UpstreamBusy, UpstreamError)
+
+
+class Overloaded(Exception):
+    """
+    Raised when an endpoint class is at its concurrency limit and its queue
+    is full, or a request waited in the queue past its deadline.
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"The {name} endpoints are at capacity, retry later")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one class of endpoints. Each request that
+    comes back within target_latency raises the limit by 1/limit (about one
+    per limit's worth of requests); a slower or failed one cuts it by
+    DECREASE_FACTOR. Requests over the limit wait in a bounded FIFO queue.
+    """
+
+    def __init__(
+        self,
+        name,
+        initial,
+        min_limit,
+        max_limit,
+        max_queue,
+        queue_timeout,
+        target_latency,
+    ):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._waiters = deque()
+        self._last_decrease = 0.0
+
+    def _has_room(self):
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self):
+        if not self._waiters and self._has_room():
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            metrics.admission_rejected.inc(self.name, "queue_full")
+            raise Overloaded(self.name, self._retry_hint())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            metrics.admission_rejected.inc(self.name, "queue_timeout")
+            raise Overloaded(self.name, self._retry_hint())
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancel.
+            if waiter.done() and not waiter.cancelled():
+                self.release(None)
+            raise
+
+    def release(self, latency, ok: bool = True):
+        """
+        Frees a slot and adjusts the limit from how long the request took;
+        latency None frees the slot without adjusting anything.
+        """
+        self.in_flight -= 1
+        if latency is not None:
+            if ok and latency <= self.target_latency:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            else:
+                now = time.monotonic()
+                if now - self._last_decrease >= DECREASE_INTERVAL:
+                    self._last_decrease = now
+                    self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+        while self._waiters and self._has_room():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _retry_hint(self):
+        return self.target_latency * (len(self._waiters) + 1) / max(1, int(self.limit))
+
+    def stats(self):
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+        }
+
+
+class Admission:
+    """
+    Holds one request's slot. Used as an async context manager for plain
+    responses; streamed responses are sent with AdmittedResponse.
+    """
+
+    def __init__(self, limiter: AdaptiveLimiter):
+        self.limiter = limiter
+        self.started = time.monotonic()
+        self.latency = None
+        self.failed = False
+        self._released = False
+
+    def _free(self, ok: bool, latency):
+        if self._released:
+            return
+        self._released = True
+        self.limiter.release(latency, ok)
+
+    def release(self, ok: bool = True):
+        """
+        Frees the slot, adjusting the limit by the time since admission.
+        """
+        self._free(ok, time.monotonic() - self.started)
+
+    def abort(self, error: Exception):
+        """
+        Frees the slot of a request that failed before its response started,
+        cutting the limit only when the error is a CONGESTION_ERRORS one.
+        """
+        if isinstance(error, CONGESTION_ERRORS):
+            self.release(ok=False)
+        else:
+            self._free(True, None)
+
+    def finish(self):
+        """
+        Frees a streamed response's slot, adjusting the limit by the delay
+        to its first output if there was any. A client leaving early is not
+        counted as a failure.
+        """
+        self._free(not self.failed, self.latency)
+
+    def mark_output(self):
+        # The first output the client waits on; its delay drives the limit.
+        if self.latency is None:
+            self.latency = time.monotonic() - self.started
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.release()
+        else:
+            self.abort(exc)
+
+    async def stream(self, chunks, timed: bool = True):
+        """
+        Yields chunks, noting when the first one goes out unless timed is
+        False, in which case the producer calls mark_output() itself.
+        """
+        try:
+            async for chunk in chunks:
+                if timed:
+                    self.mark_output()
+                yield chunk
+        except Exception:
+            self.failed = True
+            self.mark_output()
+            raise
+
+
+class AdmittedResponse(StreamingResponse):
+    """
+    Streams content and frees the admission slot once the response is over,
+    including when the client leaves before the body starts. A stream that
+    never produced output frees its slot without moving the limit.
+    """
+
+    def __init__(self, admission, content, timed: bool = True, **kwargs):
+        super().__init__(admission.stream(content, timed), **kwargs)
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.admission.finish()
+
+
+def _limiter_from_env(name, initial, min_limit, max_limit, queue, timeout, target):
+    prefix = f"ADMISSION_{name.upper()}"
+    return AdaptiveLimiter(
+        name,
+        initial=int(os.getenv(f"{prefix}_LIMIT", initial)),
+        min_limit=int(os.getenv(f"{prefix}_MIN_LIMIT", min_limit)),
+        max_limit=int(os.getenv(f"{prefix}_MAX_LIMIT", max_limit)),
+        max_queue=int(os.getenv(f"{prefix}_MAX_QUEUE", queue)),
+        queue_timeout=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", timeout)),
+        target_latency=float(os.getenv(f"{prefix}_TARGET_LATENCY", target)),
+    )
+
+
+# "llm" covers the endpoints that stream LLM answers, "data" the ones served
+# from flight data and policies alone.
+limiters = {
+    "llm": _limiter_from_env("llm", "16", "2", "64", "32", "2", "3"),
+    "data": _limiter_from_env("data", "64", "8", "256", "256", "5", "1"),
+}
+
+
+async def admit(endpoint_class: str):
+    """
+    Waits for a slot in the endpoint class and returns its Admission, or
+    raises Overloaded. Always admits when ADMISSION_ENABLED is off.
+    """
+    limiter = limiters[endpoint_class]
+    if ADMISSION_ENABLED:
+        await limiter.acquire()
+    else:
+        limiter.in_flight += 1
+    return Admission(limiter)
@@ -0,0 +1,297 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from flight_assistant import upstream
+from flight_assistant.cache import TTLCache
+from flight_assistant.cache_backends import SharedCache
+from flight_assistant.history_store import flight_history
+from flight_assistant.singleflight import SingleFlight
+
+AERODATABOX_URL = os.getenv("AERODATABOX_URL", "https://aerodatabox.p.rapidapi.com")
+
+# Flights that have left the gate or been cancelled no longer change in ways
+# we care about, so they can be kept far longer than still-scheduled ones.
+LIVE_TTL = float(os.getenv("FLIGHT_CACHE_LIVE_TTL", "120"))
+FINAL_TTL = float(os.getenv("FLIGHT_CACHE_FINAL_TTL", str(6 * 3600)))
+PAST_DAY_TTL = float(os.getenv("FLIGHT_CACHE_PAST_DAY_TTL", str(7 * 24 * 3600)))
+CACHE_SIZE = int(os.getenv("FLIGHT_CACHE_SIZE", "10000"))
+HISTORY_DAYS = 7
+# Longest date range requested from AeroDataBox in one call.
+MAX_RANGE_DAYS = int(os.getenv("AERODATABOX_MAX_RANGE_DAYS", "8"))
+
+FINAL_STATUSES = {
+    "departed",
+    "enroute",
+    "approaching",
+    "arrived",
+    "canceled",
+    "cancelled",
+    "diverted",
+}
+
+# (flight_number, day) -> flights departing on that local day
+day_cache = TTLCache(CACHE_SIZE, LIVE_TTL)
+# Concurrent misses for the same flight share one RapidAPI call.
+_in_flight = SingleFlight()
+# With a shared cache backend, days fetched by any worker or host are reused
+# and a range being fetched elsewhere is waited for instead of fetched again.
+shared_days = SharedCache("flight_days", PAST_DAY_TTL)
+shared_ranges = SharedCache("flight_ranges", LIVE_TTL)
+
+
+def _is_final(flight):
+    return flight.get("status", "").lower() in FINAL_STATUSES
+
+
+def _ttl_for(flights):
+    if flights and all(_is_final(f) for f in flights):
+        return FINAL_TTL
+    return LIVE_TTL
+
+
+def _is_past_day(day: str):
+    # Local dates run up to a day ahead of UTC, so only days strictly before
+    # yesterday (UTC) are guaranteed to be over everywhere.
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=1)
+    return datetime.strptime(day, "%Y-%m-%d").date() < cutoff
+
+
+def _departure_day(flight):
+    local = flight.get("departure", {}).get("scheduledTime", {}).get("local", "")
+    return local[:10]
+
+
+def _departure_times(flight):
+    departure = flight.get("departure", {})
+    actual = departure.get("runwayTime") or departure.get("revisedTime") or {}
+    return departure.get("scheduledTime", {}), actual
+
+
+def departure_delay_minutes(flight):
+    """
+    Minutes between scheduled and actual (or revised) departure, or None when
+    either time is missing.
+    """
+    scheduled, actual = _departure_times(flight)
+    if not scheduled.get("utc") or not actual.get("utc"):
+        return None
+    sched_time = datetime.strptime(scheduled["utc"], "%Y-%m-%d %H:%MZ")
+    actual_time = datetime.strptime(actual["utc"], "%Y-%m-%d %H:%MZ")
+    return round((actual_time - sched_time).total_seconds() / 60)
+
+
+def departs_overnight(flight):
+    # The flight slipped past local midnight; None when no new time is known.
+    scheduled, actual = _departure_times(flight)
+    if not scheduled.get("local") or not actual.get("local"):
+        return None
+    return actual["local"][:10] > scheduled["local"][:10]
+
+
+def _days_between(start: str, end: str):
+    day = datetime.strptime(start, "%Y-%m-%d").date()
+    last = datetime.strptime(end, "%Y-%m-%d").date()
+    days = []
+    while day <= last:
+        days.append(str(day))
+        day += timedelta(days=1)
+    return days
+
+
+async def _fetch_range(flight_number: str, start: str, end: str):
+    url = (
+        f"{AERODATABOX_URL}/flights/number/{flight_number}/"
+        f"{start}/{end}?dateLocalRole=Departure"
+    )
+    response = await upstream.request("aerodatabox", "GET", url)
+    if response.status_code != 200:
+        error = upstream.UpstreamError if response.status_code >= 500 else Exception
+        raise error(f"Failed to fetch historical data: {response.status_code}")
+    return response.json() or []
+
+
+async def _load_days(flight_number: str, start: str, end: str):
+    fetched = {day: [] for day in _days_between(start, end)}
+    for flight in await _fetch_range(flight_number, start, end):
+        fetched.setdefault(_departure_day(flight), []).append(flight)
+
+    # Past days can never change, so the store keeps them without expiry.
+    now = time.time()
+    expiries = {}
+    ttls = {}
+    for day, flights in fetched.items():
+        if _is_past_day(day):
+            ttls[day] = PAST_DAY_TTL
+            expiries[day] = None
+        else:
+            ttls[day] = _ttl_for(flights)
+            expiries[day] = now + ttls[day]
+        day_cache.set((flight_number, day), flights, ttl=ttls[day])
+    await flight_history.save_days(flight_number, fetched, expiries)
+    if shared_days.shared:
+        await asyncio.gather(
+            *(
+                shared_days.set((flight_number, day), flights, ttl=ttls[day])
+                for day, flights in fetched.items()
+            )
+        )
+    return fetched
+
+
+async def _load_shared_range(flight_number: str, start: str, end: str):
+    loaded_here = []
+
+    async def load():
+        loaded_here.append(True)
+        return await _load_days(flight_number, start, end)
+
+    fetched = await shared_ranges.get_or_set((flight_number, start, end), load)
+    if fetched and not loaded_here:
+        await _keep_shared_days(flight_number, fetched)
+    return fetched
+
+
+def _load_range(flight_number: str, start: str, end: str):
+    if shared_ranges.shared:
+        return _load_shared_range(flight_number, start, end)
+    return _in_flight.do(
+        ("range", flight_number, start, end), _load_days, flight_number, start, end
+    )
+
+
+def _shared_ttl(day: str):
+    # The shared tier does not report remaining lifetimes, so a day picked up
+    # from it is kept locally only as long as a live day would be.
+    return PAST_DAY_TTL if _is_past_day(day) else LIVE_TTL
+
+
+async def _keep_shared_days(flight_number: str, days):
+    """
+    Keeps days fetched by another worker in this process's memory cache and
+    history store, which /flight-stats aggregates from.
+    """
+    now = time.time()
+    expiries = {}
+    for day, flights in days.items():
+        ttl = _shared_ttl(day)
+        day_cache.set((flight_number, day), flights, ttl=ttl)
+        expiries[day] = None if _is_past_day(day) else now + ttl
+    await flight_history.save_days(flight_number, days, expiries)
+
+
+def _missing_ranges(missing):
+    """
+    Groups missing days into contiguous runs of at most MAX_RANGE_DAYS, so
+    only days we don't have are requested.
+    """
+    ranges = []
+    for day in missing:
+        date = datetime.strptime(day, "%Y-%m-%d").date()
+        if ranges:
+            start, end = ranges[-1]
+            start_date = datetime.strptime(start, "%Y-%m-%d").date()
+            end_date = datetime.strptime(end, "%Y-%m-%d").date()
+            if (
+                date - end_date == timedelta(days=1)
+                and (date - start_date).days < MAX_RANGE_DAYS
+            ):
+                ranges[-1] = (start, day)
+                continue
+        ranges.append((day, day))
+    return ranges
+
+
+async def fetch_flights_between(flight_number: str, start: str, end: str):
+    """
+    Returns every flight departing between start and end (inclusive). Days
+    come from the in-memory cache, the shared cache backend (if any), then
+    the local history store, and only the days none has are fetched from
+    AeroDataBox.
+    """
+    flight_number = flight_number.upper()
+    days = _days_between(start, end)
+    buckets = {}
+    missing = []
+    for day in days:
+        flights = day_cache.get((flight_number, day))
+        if flights is None:
+            missing.append(day)
+        else:
+            buckets[day] = flights
+
+    if missing and shared_days.shared:
+        found = await asyncio.gather(
+            *(shared_days.get((flight_number, day)) for day in missing)
+        )
+        shared = {day: flights for day, flights in zip(missing, found) if flights}
+        if shared:
+            await _keep_shared_days(flight_number, shared)
+            buckets.update(shared)
+        missing = [day for day in missing if day not in buckets]
+
+    if missing:
+        stored = await flight_history.load_days(flight_number, missing)
+        now = time.time()
+        for day, (flights, expires_at) in stored.items():
+            ttl = PAST_DAY_TTL if expires_at is None else expires_at - now
+            day_cache.set((flight_number, day), flights, ttl=ttl)
+            buckets[day] = flights
+        missing = [day for day in missing if day not in stored]
+
+    if missing:
+        results = await asyncio.gather(
+            *(
+                _load_range(flight_number, start, end)
+                for start, end in _missing_ranges(missing)
+            )
+        )
+        for fetched in results:
+            for day, flights in fetched.items():
+                if day in missing:
+                    buckets[day] = flights
+
+    return [flight for day in days for flight in buckets.get(day, [])]
+
+
+async def fetch_flight_window(
+    flight_number: str, date: str, days: int = HISTORY_DAYS
+):
+    """
+    Returns the flight's history from `days` before `date` up to and including
+    `date`. One window serves both the target-day details and the stats.
+    """
+    start, end = window_bounds(date, days)
+    return await fetch_flights_between(flight_number, start, end)
+
+
+def window_bounds(date: str, days: int = HISTORY_DAYS):
+    end = datetime.strptime(date, "%Y-%m-%d").date()
+    return str(end - timedelta(days=days)), str(end)
+
+
+def flights_on_day(flights, day: str):
+    return [f for f in flights if _departure_day(f) == day]
+
+
+async def fetch_departures(
+    airport_iata: str, offset_minutes: int = -360, duration_minutes: int = 720
+):
+    """
+    Departures board for an airport, relative to now. AeroDataBox limits
+    the window to 12 hours.
+    """
+    url = (
+        f"{AERODATABOX_URL}/flights/airports/iata/{airport_iata.upper()}"
+        f"?offsetMinutes={offset_minutes}&durationMinutes={duration_minutes}"
+        "&direction=Departure&withCancelled=true&withCodeshared=false"
+        "&withCargo=false&withPrivate=false"
+    )
+    response = await upstream.request("aerodatabox", "GET", url)
+    if response.status_code == 204:
+        return []
+    if response.status_code != 200:
+        error = upstream.UpstreamError if response.status_code >= 500 else Exception
+        raise error(f"Failed to fetch departures: {response.status_code}")
+    return (response.json() or {}).get("departures", [])
@@ -0,0 +1,183 @@
+import asyncio
+
+import numpy as np
+
+from flight_assistant.history_store import DELAY_CUTOFF_MINUTES, flight_history
+
+# Upper edges (minutes) of the delay distribution buckets.
+DELAY_BUCKET_EDGES = (0, 15, 30, 60, 120, 180)
+DELAY_BUCKET_LABELS = (
+    "early_or_on_time",
+    "1-15",
+    "16-30",
+    "31-60",
+    "61-120",
+    "121-180",
+    "180+",
+)
+PERCENTILES = (50, 90, 95, 99)
+GROUP_FIELDS = ("flight_number", "airline", "route", "day")
+
+# Missing delays come back as this sentinel so the scan stays numeric.
+_MISSING_DELAY = -1e9
+
+COLUMNS_SQL = (
+    "flight_number, day, IFNULL(airline_iata, ''), IFNULL(origin, ''), "
+    "IFNULL(destination, ''), lower(status) = 'canceled', "
+    f"IFNULL(delay_minutes, {_MISSING_DELAY})"
+)
+COLUMN_DTYPE = np.dtype(
+    [
+        ("flight_number", "U10"),
+        ("day", "U10"),
+        ("airline", "U4"),
+        ("origin", "U4"),
+        ("destination", "U4"),
+        ("cancelled", "?"),
+        ("delay", "f8"),
+    ]
+)
+
+
+def _read_columns(cursor):
+    # Rows stream from SQLite straight into one structured array.
+    return np.fromiter(cursor, dtype=COLUMN_DTYPE)
+
+
+def _scope(start, end, flight_numbers, airline, origin, destination):
+    clauses = ["day BETWEEN ? AND ?"]
+    params = [start, end]
+    if flight_numbers:
+        placeholders = ",".join("?" * len(flight_numbers))
+        clauses.append(f"flight_number IN ({placeholders})")
+        params.extend(f.upper() for f in flight_numbers)
+    if airline:
+        clauses.append("airline_iata = ?")
+        params.append(airline.upper())
+    if origin:
+        clauses.append("origin = ?")
+        params.append(origin.upper())
+    if destination:
+        clauses.append("destination = ?")
+        params.append(destination.upper())
+    return " AND ".join(clauses), params
+
+
+def summarize(columns):
+    """
+    Computes reliability figures over whole columns at once: rates, delay
+    percentiles and the delay distribution.
+    """
+    total = len(columns)
+    cancelled = columns["cancelled"]
+    delay = columns["delay"]
+    departed = ~cancelled & (delay != _MISSING_DELAY)
+    delays = delay[departed]
+    delayed = int(np.count_nonzero(delays > DELAY_CUTOFF_MINUTES))
+    on_time = int(delays.size) - delayed
+    cancelled_count = int(np.count_nonzero(cancelled))
+
+    summary = {
+        "total_flights": total,
+        "on_time": on_time,
+        "delayed": delayed,
+        "cancelled": cancelled_count,
+        "on_time_rate": round(on_time / total, 4) if total else 0.0,
+        "delay_rate": round(delayed / total, 4) if total else 0.0,
+        "cancellation_rate": round(cancelled_count / total, 4) if total else 0.0,
+        "mean_delay_minutes": round(float(delays.mean()), 2) if delays.size else 0.0,
+        "delay_percentiles": {},
+        "delay_distribution": {},
+    }
+    if delays.size:
+        values = np.percentile(delays, PERCENTILES)
+        summary["delay_percentiles"] = {
+            f"p{p}": round(float(v), 1) for p, v in zip(PERCENTILES, values)
+        }
+        edges = np.array(DELAY_BUCKET_EDGES)
+        counts = np.bincount(
+            np.searchsorted(edges, delays, side="left"),
+            minlength=len(DELAY_BUCKET_LABELS),
+        )
+        summary["delay_distribution"] = dict(
+            zip(DELAY_BUCKET_LABELS, (int(c) for c in counts))
+        )
+    return summary
+
+
+def summarize_groups(columns, group_by: str):
+    """
+    Per-group rates using one np.unique and a few bincounts, rather than a
+    Python loop per group.
+    """
+    if group_by == "route":
+        keys = np.char.add(np.char.add(columns["origin"], "-"), columns["destination"])
+    elif group_by == "airline":
+        keys = columns["airline"]
+    else:
+        keys = columns[group_by]
+    if keys.size == 0:
+        return []
+
+    groups, inverse = np.unique(keys, return_inverse=True)
+    delay = columns["delay"]
+    cancelled = columns["cancelled"]
+    departed = ~cancelled & (delay != _MISSING_DELAY)
+
+    totals = np.bincount(inverse)
+    cancelled_counts = np.bincount(inverse, weights=cancelled)
+    departed_counts = np.bincount(inverse, weights=departed)
+    delayed_counts = np.bincount(
+        inverse, weights=departed & (delay > DELAY_CUTOFF_MINUTES)
+    )
+    delay_sums = np.bincount(inverse, weights=np.where(departed, delay, 0.0))
+    mean_delays = np.divide(
+        delay_sums,
+        departed_counts,
+        out=np.zeros_like(delay_sums),
+        where=departed_counts > 0,
+    )
+
+    return [
+        {
+            group_by: str(group),
+            "total_flights": int(total),
+            "on_time_rate": round(float((dep - dly) / total), 4),
+            "delay_rate": round(float(dly / total), 4),
+            "cancellation_rate": round(float(canc / total), 4),
+            "mean_delay_minutes": round(float(mean), 2),
+        }
+        for group, total, dep, dly, canc, mean in zip(
+            groups,
+            totals,
+            departed_counts,
+            delayed_counts,
+            cancelled_counts,
+            mean_delays,
+        )
+    ]
+
+
+async def reliability(
+    start: str,
+    end: str,
+    flight_numbers=None,
+    airline=None,
+    origin=None,
+    destination=None,
+    group_by=None,
+):
+    """
+    Reliability aggregates over the local flight history for any mix of
+    flight numbers, airline and route between start and end (inclusive).
+    """
+    where, params = _scope(start, end, flight_numbers, airline, origin, destination)
+    columns = await flight_history.scan(COLUMNS_SQL, where, params, _read_columns)
+
+    def compute():
+        result = {"summary": summarize(columns)}
+        if group_by:
+            result["groups"] = summarize_groups(columns, group_by)
+        return result
+
+    return await asyncio.to_thread(compute)
@@ -0,0 +1,385 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import zlib
+from urllib.parse import urlparse
+
+from flight_assistant.cache import TTLCache
+from flight_assistant.singleflight import SingleFlight
+
+# memory (one process), sqlite (every worker on a host) or redis (many hosts).
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+# SQLite file for "sqlite", redis://[:password@]host:port/db for "redis".
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "skysettle")
+# Shared entries are also kept in-process this long to save round trips.
+LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "5"))
+# How long one process may hold a key while loading it, and how long the
+# others wait for its result before loading it themselves.
+LOCK_TTL = float(os.getenv("CACHE_LOCK_TTL", "30"))
+LOCK_WAIT = float(os.getenv("CACHE_LOCK_WAIT", "10"))
+LOCK_POLL_INTERVAL = 0.05
+REDIS_POOL_SIZE = int(os.getenv("CACHE_REDIS_POOL_SIZE", "8"))
+REDIS_TIMEOUT = float(os.getenv("CACHE_REDIS_TIMEOUT", "1"))
+
+# Encoded values this long or longer are zlib-compressed.
+COMPRESS_MIN_BYTES = 256
+_RAW, _ZLIB = b"j", b"z"
+
+
+def encode(value):
+    """
+    Compact JSON, zlib-compressed when large, behind a one-byte format tag.
+    """
+    data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return _ZLIB + zlib.compress(data)
+    return _RAW + data
+
+
+def decode(blob: bytes):
+    tag, data = blob[:1], blob[1:]
+    if tag == _ZLIB:
+        data = zlib.decompress(data)
+    return json.loads(data)
+
+
+class RedisError(Exception):
+    pass
+
+
+# Backend failures are treated as cache misses, never as request failures.
+CACHE_ERRORS = (OSError, EOFError, asyncio.TimeoutError, RedisError, sqlite3.Error)
+
+
+class MemoryBackend:
+    """
+    Per-process backend. When it is configured SharedCache skips the backend
+    and serves everything from its local tier.
+    """
+
+    shared = False
+
+    def __init__(self, maxsize: int = 10000):
+        self._cache = TTLCache(maxsize, LOCK_TTL)
+
+    async def get(self, key: str):
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._cache.set(key, value, ttl=ttl)
+
+    async def add(self, key: str, value: bytes, ttl: float):
+        if self._cache.get(key) is not None:
+            return False
+        self._cache.set(key, value, ttl=ttl)
+        return True
+
+    async def delete(self, key: str):
+        self._cache.delete(key)
+
+    async def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """
+    Cache table in a SQLite file that every worker on the host opens. WAL
+    mode lets readers carry on while another worker writes.
+    """
+
+    shared = True
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, timeout=5, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._lock = asyncio.Lock()
+        self._writes = 0
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _get(self, key: str):
+        row = self._conn.execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: bytes, ttl: float):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (key, value, now + ttl)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def _add(self, key: str, value: bytes, ttl: float):
+        now = time.time()
+        self._conn.execute(
+            "DELETE FROM cache WHERE key = ? AND expires_at <= ?", (key, now)
+        )
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO cache VALUES (?, ?, ?)", (key, value, now + ttl)
+        )
+        return cursor.rowcount == 1
+
+    def _delete(self, key: str):
+        self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    async def get(self, key: str):
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._run(self._set, key, value, ttl)
+
+    async def add(self, key: str, value: bytes, ttl: float):
+        return await self._run(self._add, key, value, ttl)
+
+    async def delete(self, key: str):
+        await self._run(self._delete, key)
+
+    async def close(self):
+        self._conn.close()
+
+
+class RedisBackend:
+    """
+    Minimal RESP client covering GET, SET (PX/NX) and DEL, enough for Redis
+    or anything that speaks its protocol. Connections are pooled, and one
+    that fails mid-call is dropped rather than reused out of sync.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, pool_size: int = REDIS_POOL_SIZE):
+        parsed = urlparse(url or "redis://127.0.0.1:6379/0")
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = REDIS_TIMEOUT
+        self._idle = []
+        self._slots = asyncio.Semaphore(pool_size)
+
+    @staticmethod
+    def _pack(*args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    async def _read_reply(self, reader):
+        line = await reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise EOFError("Connection closed by cache server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            return (await reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            count = int(rest)
+            if count < 0:
+                return None
+            return [await self._read_reply(reader) for _ in range(count)]
+        raise ConnectionError(f"Unexpected reply from cache server: {line!r}")
+
+    async def _call(self, connection, *args):
+        reader, writer = connection
+        writer.write(self._pack(*args))
+        await writer.drain()
+        return await self._read_reply(reader)
+
+    async def _connect(self):
+        connection = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._call(connection, "AUTH", self.password)
+        if self.db:
+            await self._call(connection, "SELECT", self.db)
+        return connection
+
+    async def execute(self, *args):
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = await asyncio.wait_for(self._connect(), self.timeout)
+                reply = await asyncio.wait_for(
+                    self._call(connection, *args), self.timeout
+                )
+            except RedisError:
+                # The server answered, so the connection is still in step.
+                self._idle.append(connection)
+                raise
+            except BaseException:
+                if connection is not None:
+                    connection[1].close()
+                raise
+            self._idle.append(connection)
+            return reply
+
+    async def get(self, key: str):
+        return await self.execute("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.execute("SET", key, value, "PX", max(1, int(ttl * 1000)))
+
+    async def add(self, key: str, value: bytes, ttl: float):
+        reply = await self.execute(
+            "SET", key, value, "PX", max(1, int(ttl * 1000)), "NX"
+        )
+        return reply == "OK"
+
+    async def delete(self, key: str):
+        await self.execute("DEL", key)
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+
+def create_backend(name: str = CACHE_BACKEND, url: str = CACHE_URL):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend(url or "data/cache.db")
+    if name == "redis":
+        return RedisBackend(url)
+    raise ValueError(f"Unknown cache backend: {name}")
+
+
+backend = create_backend()
+
+
+async def close_backend():
+    await backend.close()
+
+
+class SharedCache:
+    """
+    One namespace in the configured cache backend, with a short-lived local
+    copy in front. With the memory backend it is a plain in-process cache.
+    """
+
+    def __init__(self, namespace: str, ttl: float, local_size: int = 2000):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.shared = backend.shared
+        self.local = TTLCache(local_size, self._local_ttl(ttl))
+        self.hits = 0
+        self.misses = 0
+        self._loads = SingleFlight()
+
+    def _key(self, key):
+        if isinstance(key, (tuple, list)):
+            key = "|".join(map(str, key))
+        return f"{CACHE_PREFIX}:{self.namespace}:{key}"
+
+    def _local_ttl(self, ttl: float):
+        return min(ttl, LOCAL_TTL) if self.shared else ttl
+
+    async def _call(self, operation, default=None):
+        try:
+            return await operation
+        except CACHE_ERRORS as e:
+            print(f"[Cache Error] {self.namespace}: {e!r}")
+            return default
+
+    async def _get_shared(self, key):
+        blob = await self._call(backend.get(self._key(key)))
+        if blob is None:
+            return None
+        value = decode(blob)
+        self.local.set(key, value, ttl=self._local_ttl(self.ttl))
+        return value
+
+    async def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared:
+            value = await self._get_shared(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(key, value, ttl=self._local_ttl(ttl))
+        if self.shared:
+            await self._call(backend.set(self._key(key), encode(value), ttl))
+
+    async def get_or_set(self, key, loader, ttl: float = None):
+        """
+        Returns the cached value, or calls loader() once for everyone asking:
+        callers in this process share one call, and other processes wait for
+        the lock holder's result instead of calling the loader too. Empty
+        results are returned but not cached.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+        return await self._loads.do(key, self._load, key, loader, ttl)
+
+    async def _load(self, key, loader, ttl):
+        if not self.shared:
+            return await self._load_and_set(key, loader, ttl)
+
+        lock_key = self._key(key) + ":lock"
+        if await self._call(backend.add(lock_key, b"1", LOCK_TTL), default=True):
+            try:
+                return await self._load_and_set(key, loader, ttl)
+            finally:
+                await self._call(backend.delete(lock_key))
+
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            value = await self._get_shared(key)
+            if value is not None:
+                return value
+            # Released without a value: the holder's load came back empty.
+            if await self._call(backend.get(lock_key)) is None:
+                break
+        return await self._load_and_set(key, loader, ttl)
+
+    async def _load_and_set(self, key, loader, ttl):
+        value = await loader()
+        if value:
+            await self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.local),
+            "maxsize": self.local.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+# Where every AeroDataBox flight we have seen is kept, one row per flight.
+FLIGHT_HISTORY_PATH = os.getenv("FLIGHT_HISTORY_PATH", "data/flight_history.db")
+
+# Flights leaving more than this many minutes late count as delayed.
+DELAY_CUTOFF_MINUTES = 15
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS flights (
+    flight_number TEXT NOT NULL,
+    day TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    airline_iata TEXT,
+    origin TEXT,
+    destination TEXT,
+    status TEXT,
+    scheduled_local TEXT,
+    scheduled_utc TEXT,
+    delay_minutes REAL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (flight_number, day, seq)
+);
+CREATE INDEX IF NOT EXISTS flights_airline_day ON flights (airline_iata, day);
+CREATE INDEX IF NOT EXISTS flights_route_day ON flights (origin, destination, day);
+CREATE TABLE IF NOT EXISTS coverage (
+    flight_number TEXT NOT NULL,
+    day TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (flight_number, day)
+);
+"""
+
+
+def _runway_delay_minutes(flight):
+    # Stats only count flights that actually left, i.e. have a runway time.
+    departure = flight.get("departure", {})
+    sched = departure.get("scheduledTime", {}).get("utc")
+    actual = departure.get("runwayTime", {}).get("utc")
+    if not sched or not actual:
+        return None
+    sched_time = datetime.strptime(sched, "%Y-%m-%d %H:%MZ")
+    actual_time = datetime.strptime(actual, "%Y-%m-%d %H:%MZ")
+    return (actual_time - sched_time).total_seconds() / 60
+
+
+def _row(flight_number: str, day: str, seq: int, flight):
+    departure = flight.get("departure", {})
+    return (
+        flight_number,
+        day,
+        seq,
+        flight.get("airline", {}).get("iata"),
+        departure.get("airport", {}).get("iata"),
+        flight.get("arrival", {}).get("airport", {}).get("iata"),
+        flight.get("status", ""),
+        departure.get("scheduledTime", {}).get("local", "Unknown"),
+        departure.get("scheduledTime", {}).get("utc"),
+        _runway_delay_minutes(flight),
+        json.dumps(flight, separators=(",", ":")),
+    )
+
+
+class FlightHistoryStore:
+    """
+    SQLite store of per-flight, per-day AeroDataBox records. Days are marked
+    covered when fetched, so later windows only need the days that are
+    missing or stale, and stats are computed with indexed SQL queries.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._lock = asyncio.Lock()
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _save_days(self, flight_number: str, days, expiries):
+        with self._conn:
+            for day, flights in days.items():
+                self._conn.execute(
+                    "DELETE FROM flights WHERE flight_number = ? AND day = ?",
+                    (flight_number, day),
+                )
+                self._conn.executemany(
+                    "INSERT INTO flights VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [_row(flight_number, day, i, f) for i, f in enumerate(flights)],
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?)",
+                    (flight_number, day, expiries[day]),
+                )
+
+    async def save_days(self, flight_number: str, days, expiries):
+        """
+        Stores the flights for each day. expiries maps day to the time the
+        day must be refetched, or None for days that can no longer change.
+        """
+        await self._run(self._save_days, flight_number, days, expiries)
+
+    def _load_days(self, flight_number: str, days):
+        placeholders = ",".join("?" * len(days))
+        covered = self._conn.execute(
+            f"SELECT day, expires_at FROM coverage WHERE flight_number = ? "
+            f"AND day IN ({placeholders}) AND (expires_at IS NULL OR expires_at > ?)",
+            (flight_number, *days, time.time()),
+        ).fetchall()
+        result = {day: ([], expires_at) for day, expires_at in covered}
+        if not result:
+            return result
+        placeholders = ",".join("?" * len(result))
+        rows = self._conn.execute(
+            f"SELECT day, payload FROM flights WHERE flight_number = ? "
+            f"AND day IN ({placeholders}) ORDER BY day, seq",
+            (flight_number, *result),
+        ).fetchall()
+        for day, payload in rows:
+            result[day][0].append(json.loads(payload))
+        return result
+
+    async def load_days(self, flight_number: str, days):
+        """
+        Returns {day: (flights, expires_at)} for the requested days that are
+        covered and still fresh.
+        """
+        if not days:
+            return {}
+        return await self._run(self._load_days, flight_number, list(days))
+
+    def _flight_stats(self, flight_number: str, start: str, end: str):
+        where = "flight_number = ? AND day BETWEEN ? AND ?"
+        params = (flight_number, start, end)
+        total, cancelled, delayed, on_time, total_delay = self._conn.execute(
+            "SELECT COUNT(*), "
+            "COALESCE(SUM(lower(status) = 'canceled'), 0), "
+            "COALESCE(SUM(lower(status) != 'canceled' AND delay_minutes > ?), 0), "
+            "COALESCE(SUM(lower(status) != 'canceled' AND delay_minutes <= ?), 0), "
+            "COALESCE(SUM(CASE WHEN lower(status) != 'canceled' "
+            "THEN delay_minutes END), 0) "
+            f"FROM flights WHERE {where}",
+            (DELAY_CUTOFF_MINUTES, DELAY_CUTOFF_MINUTES, *params),
+        ).fetchone()
+        rows = self._conn.execute(
+            f"SELECT scheduled_local, status, delay_minutes FROM flights "
+            f"WHERE {where} ORDER BY day, seq",
+            params,
+        ).fetchall()
+
+        details = []
+        for flight_date, status, delay_min in rows:
+            if status.lower() == "canceled":
+                entry_status, delay = "Cancelled", None
+            elif delay_min is None:
+                entry_status, delay = "Unknown (missing times)", None
+            else:
+                entry_status = (
+                    "Delayed" if delay_min > DELAY_CUTOFF_MINUTES else "On Time"
+                )
+                delay = round(delay_min)
+            details.append(
+                {"date": flight_date, "status": entry_status, "delay_minutes": delay}
+            )
+
+        return {
+            "total_flights": total,
+            "on_time": on_time,
+            "delayed": delayed,
+            "cancelled": cancelled,
+            "avg_delay_minutes": round(total_delay / delayed, 2) if delayed else 0.0,
+            "details": details,
+        }
+
+    async def flight_stats(self, flight_number: str, start: str, end: str):
+        return await self._run(self._flight_stats, flight_number, start, end)
+
+    def _scan(self, columns: str, where: str, params, consume):
+        sql = f"SELECT {columns} FROM flights WHERE {where}"
+        return consume(self._conn.execute(sql, params))
+
+    async def scan(self, columns: str, where: str, params, consume):
+        """
+        Runs a query on the store's thread and hands the cursor to consume, so
+        large scans can be read straight into arrays without a row list.
+        """
+        return await self._run(self._scan, columns, where, params, consume)
+
+
+flight_history = FlightHistoryStore(FLIGHT_HISTORY_PATH)
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from flight_assistant.cache import TTLCache
+from flight_assistant.cache_backends import SharedCache, backend
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+# Optional SQLite file so completions survive a restart.
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def completion_key(model: str, template: str, **inputs):
+    """
+    Hashes the model, prompt template name and the normalized inputs that
+    went into the prompt. Passengers on the same flight share one key.
+    """
+    payload = json.dumps(
+        {"model": model, "template": template, "inputs": _normalize(inputs)},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteCompletionStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = asyncio.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _get(self, key: str):
+        row = self._conn.execute(
+            "SELECT text, expires_at FROM completions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    def _set(self, key: str, text: str, ttl: float):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO completions (key, text, expires_at) "
+            "VALUES (?, ?, ?)",
+            (key, text, now + ttl),
+        )
+        self._conn.execute("DELETE FROM completions WHERE expires_at <= ?", (now,))
+        self._conn.commit()
+
+    async def get(self, key: str):
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, text: str, ttl: float):
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, text, ttl)
+
+
+class CompletionCache:
+    """
+    Two-tier completion cache: a bounded in-memory TTL cache in front of the
+    shared cache backend when one is configured, or else an optional SQLite
+    store.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, path: str = None):
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize, ttl)
+        if backend.shared:
+            # Completions never change for a key, so the memory tier above
+            # already serves as the local copy.
+            self.disk = SharedCache("llm", ttl, local_size=0)
+        else:
+            self.disk = SQLiteCompletionStore(path) if path else None
+
+    async def get(self, key: str):
+        text = self.memory.get(key)
+        if text is None and self.disk is not None:
+            text = await self.disk.get(key)
+            if text is not None:
+                self.memory.set(key, text)
+        return text
+
+    async def set(self, key: str, text: str):
+        self.memory.set(key, text)
+        if self.disk is not None:
+            await self.disk.set(key, text, self.ttl)
+
+    def stats(self):
+        return self.memory.stats()
+
+
+completion_cache = CompletionCache(LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_PATH)
@@ -1,44 +1,217 @@
+import asyncio
 import json
-import requests
+import logging
 import os
-from dotenv import load_dotenv
+import re
 import time
 
-load_dotenv()
+from flight_assistant import metrics, upstream
+from flight_assistant.llm_cache import completion_cache
+from flight_assistant.scheduler import PRIORITY_INTERACTIVE, request_priority
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_ENDPOINT = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_ENDPOINT = os.getenv(
+    "GROQ_ENDPOINT", "https://api.groq.com/openai/v1/chat/completions"
+)
+MODEL = "deepseek-r1-distill-llama-70b"
+# "fallback" races FALLBACK_MODEL against a slow MODEL, "hedge" sends MODEL a
+# second request, "off" just waits.
+HEDGE_MODE = os.getenv("LLM_HEDGE_MODE", "fallback").lower()
+FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "llama-3.1-8b-instant")
+# Seconds to wait for MODEL's first token before hedging.
+FIRST_TOKEN_BUDGET = float(os.getenv("LLM_FIRST_TOKEN_BUDGET", "1.5"))
+# Seconds to wait for any first token, and then between tokens, before the
+# stream is abandoned.
+FIRST_TOKEN_DEADLINE = float(os.getenv("LLM_FIRST_TOKEN_DEADLINE", "15"))
+TOKEN_TIMEOUT = float(os.getenv("LLM_TOKEN_TIMEOUT", "10"))
 
+# Per-answer serving records; silent unless logging is configured for it.
+logger = logging.getLogger(__name__)
 
-def call_language_model(prompt: str):
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json",
-    }
+
+class Completion:
+    """
+    One upstream completion stream. Its first token is requested as soon as
+    it is created so several can race; path says why it was started.
+    """
+
+    def __init__(self, path: str, payload):
+        self.path = path
+        self.model = payload["model"]
+        self.started = time.perf_counter()
+        self._tokens = _stream_tokens(payload)
+        self.first = asyncio.ensure_future(self._tokens.__anext__())
+
+    def has_token(self):
+        return (
+            self.first.done()
+            and not self.first.cancelled()
+            and self.first.exception() is None
+        )
+
+    async def stream(self):
+        try:
+            try:
+                chunk = self.first.result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(
+                        self._tokens.__anext__(), TOKEN_TIMEOUT
+                    )
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        finally:
+            await self._tokens.aclose()
+
+    async def cancel(self):
+        self.first.cancel()
+        await asyncio.gather(self.first, return_exceptions=True)
+        await self._tokens.aclose()
+
+
+def _hedge_payload(payload):
+    # Background work never hedges; it can wait and the quota is better
+    # spent on users.
+    if request_priority.get() != PRIORITY_INTERACTIVE:
+        return None
+    if HEDGE_MODE == "fallback":
+        return {**payload, "model": FALLBACK_MODEL}
+    if HEDGE_MODE == "hedge":
+        return dict(payload)
+    return None
+
+
+async def _first_to_answer(racing, deadline: float):
+    pending = {completion.first for completion in racing}
+    while pending:
+        timeout = max(0.0, deadline - time.perf_counter())
+        done, pending = await asyncio.wait(
+            pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        if not done:
+            raise asyncio.TimeoutError(
+                f"No LLM token within {FIRST_TOKEN_DEADLINE:g}s"
+            )
+        for completion in racing:
+            if completion.has_token():
+                return completion
+    # Every request failed or came back empty: surface the primary's outcome.
+    return racing[0]
+
+
+async def start_completion(prompt: str):
+    """
+    Sends the prompt to MODEL and returns the first Completion to produce a
+    token. If MODEL has not answered within FIRST_TOKEN_BUDGET, a hedged or
+    fallback request is raced against it and the loser is cancelled.
+    """
     payload = {
-        "model": "deepseek-r1-distill-llama-70b",
+        "model": MODEL,
         "messages": [{"role": "user", "content": prompt}],
         "temperature": 0.1,
         "max_tokens": 1000,
         "stream": True,
     }
+    primary = Completion("primary", payload)
+    racing = [primary]
+    hedge = _hedge_payload(payload)
+    if hedge is not None:
+        await asyncio.wait([primary.first], timeout=FIRST_TOKEN_BUDGET)
+        if not primary.has_token():
+            racing.append(Completion(HEDGE_MODE, hedge))
+            metrics.llm_hedges.inc(HEDGE_MODE)
+
+    try:
+        winner = await _first_to_answer(racing, primary.started + FIRST_TOKEN_DEADLINE)
+    except BaseException:
+        for completion in racing:
+            await completion.cancel()
+        raise
+    for completion in racing:
+        if completion is not winner:
+            await completion.cancel()
+
+    metrics.llm_served.inc(winner.path, winner.model)
+    return winner
 
-    response = requests.post(GROQ_ENDPOINT, headers=headers, json=payload, stream=True)
 
-    def stream_response():
-        for line in response.iter_lines():
-            if line and line.startswith(b"data: "):
-                line = line[len(b"data: ") :]
-                if line.strip() == b"[DONE]":
+async def _stream_tokens(payload):
+    started = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    async with upstream.stream(
+        "groq", "POST", GROQ_ENDPOINT, json=payload
+    ) as response:
+        async for line in response.aiter_lines():
+            if line and line.startswith("data: "):
+                line = line[len("data: ") :]
+                if line.strip() == "[DONE]":
                     break
                 try:
-                    data = json.loads(line.decode("utf-8"))
+                    data = json.loads(line)
                     content = (
                         data.get("choices", [{}])[0].get("delta", {}).get("content")
                     )
-                    if content:
-                        yield content
                 except Exception:
                     continue
+                # Groq reports usage on the last chunk under x_groq.
+                usage = (data.get("x_groq") or {}).get("usage") or data.get("usage")
+                if usage and usage.get("prompt_tokens"):
+                    metrics.llm_prompt_tokens.observe(
+                        payload["model"], value=usage["prompt_tokens"]
+                    )
+                if content:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        metrics.llm_ttft_seconds.observe(
+                            payload["model"], value=first_token_at - started
+                        )
+                    tokens += 1
+                    yield content
+
+    metrics.llm_tokens.inc(payload["model"], amount=tokens)
+    if tokens > 1:
+        elapsed = time.perf_counter() - first_token_at
+        if elapsed > 0:
+            metrics.llm_tokens_per_second.observe(
+                payload["model"], value=(tokens - 1) / elapsed
+            )
+
+
+async def stream_completion(prompt: str, cache_key: str = None):
+    """
+    Streams a completion, serving it from the completion cache when possible.
+    Cached answers are replayed word by word so clients see the same stream.
+    Answers from the fallback model are served but not cached. Every answer
+    is logged at INFO with the path that served it against its cache key.
+    """
+    key = cache_key[:12] if cache_key is not None else "-"
+    if cache_key is not None:
+        text = await completion_cache.get(cache_key)
+        if text is not None:
+            metrics.llm_served.inc("cache", MODEL)
+            logger.info("[LLM] %s cache %s", key, MODEL)
+            for chunk in re.findall(r"\s*\S+\s*", text):
+                yield chunk
+            return
+
+    chunks = []
+    with metrics.span("call_language_model"):
+        started = time.perf_counter()
+        completion = await start_completion(prompt)
+        logger.info(
+            "[LLM] %s %s %s first token after %.0f ms",
+            key,
+            completion.path,
+            completion.model,
+            (time.perf_counter() - started) * 1000,
+        )
+        async for chunk in completion.stream():
+            chunks.append(chunk)
+            yield chunk
 
-    return stream_response()
+    if cache_key is not None and chunks and completion.model == MODEL:
+        await completion_cache.set(cache_key, "".join(chunks))
@@ -1,20 +1,74 @@
 # flight_assistant/main.py
-from fastapi import FastAPI, Query
-from fastapi.responses import StreamingResponse, JSONResponse
-import requests
+from fastapi import FastAPI, Header, Query
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from pydantic import BaseModel
+from typing import List
+import asyncio
+import hmac
+import json
+import math
 import os
 import uvicorn
-from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from datetime import datetime
 import time
 
-from flight_assistant.policy_loader import load_policies
-from flight_assistant.lm import call_language_model
-from dotenv import load_dotenv
+from flight_assistant import (
+    aerodatabox,
+    analytics,
+    metrics,
+    prefetch,
+    upstream,
+    web_context,
+)
+from flight_assistant.admission import (
+    AdmittedResponse,
+    Overloaded,
+    admit,
+    limiters,
+)
+from flight_assistant.cache import TTLCache
+from flight_assistant.cache_backends import close_backend
+from flight_assistant.policy_loader import PolicyStore, find_airline_policy
+from flight_assistant.prompt_budget import (
+    budget_eligibility,
+    estimate_tokens,
+    select_snippets,
+)
+from flight_assistant.history_store import flight_history
+from flight_assistant.llm_cache import completion_cache, completion_key
+from flight_assistant.lm import MODEL, stream_completion
+from flight_assistant.rules import evaluate_eligibility, render_eligibility
+from flight_assistant.scheduler import (
+    PRIORITY_BATCH,
+    UpstreamBusy,
+    request_priority,
+    schedulers,
+)
+from flight_assistant.singleflight import SingleFlight, StreamGroup
 from fastapi.middleware.cors import CORSMiddleware
 
-load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await upstream.start_clients()
+    worker = None
+    if prefetch.PREFETCH_ENABLED:
+        watchlist = prefetch.parse_watchlist(prefetch.PREFETCH_WATCHLIST)
+        worker = prefetch.PrefetchWorker(watchlist, warm_flight)
+        worker.start()
+    policies.start_watching(POLICY_RELOAD_INTERVAL)
+    try:
+        yield
+    finally:
+        await policies.stop_watching()
+        if worker is not None:
+            await worker.stop()
+        await upstream.close_clients()
+        await close_backend()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # add CORS middleware
 
@@ -28,48 +82,86 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY")
-RAPIDAPI_HOST = "aerodatabox.p.rapidapi.com"
-BRAVE_API_KEY = os.getenv("BRAVE_API_KEY")
-BRAVE_API_URL = "https://api.search.brave.com/res/v1/web/search"
+# Per-stage budgets (seconds) for the cancellation-reason pipeline; the web
+# search budget is WEB_SEARCH_TIMEOUT in web_context.
+FLIGHT_DATA_TIMEOUT = float(os.getenv("FLIGHT_DATA_TIMEOUT", "15"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "45"))
 
-policies = load_policies("data/airline_policies.json")
+# Route and airline reliability context for the reason prompt.
+RELIABILITY_CONTEXT_DAYS = int(os.getenv("RELIABILITY_CONTEXT_DAYS", "30"))
+# Route and airline summaries for the reason prompt are reused for this long
+# (seconds) rather than rescanning the history store on every request.
+RELIABILITY_CACHE_TTL = float(os.getenv("RELIABILITY_CACHE_TTL", "300"))
+# Longest window /reliability aggregates over.
+MAX_RELIABILITY_DAYS = int(os.getenv("MAX_RELIABILITY_DAYS", "366"))
+# Reliability rates enter the reason cache key rounded to this step.
+RELIABILITY_KEY_STEP = float(os.getenv("RELIABILITY_KEY_STEP", "0.05"))
+# Longest /flight-stats window served from the local history store.
+MAX_HISTORY_DAYS = int(os.getenv("MAX_HISTORY_DAYS", "90"))
 
+# Distinct flights per /compensation/batch call, and how many run at once.
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
 
-def query_brave_search(query: str, count: int = 5):
-    headers = {"Accept": "application/json", "X-Subscription-Token": BRAVE_API_KEY}
-    params = {"q": query, "count": count}
-
-    try:
-        response = requests.get(BRAVE_API_URL, headers=headers, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"[Brave Search Error] {e}")
-        return {}
+POLICY_PATH = os.getenv("POLICY_PATH", "data/airline_policies.json")
+# How often (seconds) the policy file is checked for changes; 0 disables it.
+POLICY_RELOAD_INTERVAL = float(os.getenv("POLICY_RELOAD_INTERVAL", "30"))
+# Required by the /admin endpoints, which are disabled when it is unset.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
+policies = PolicyStore(POLICY_PATH)
 
-def extract_brave_snippets(brave_response, max_snippets=5):
-    try:
-        results = brave_response.get("web", {}).get("results", [])
-        snippets = [r["description"] for r in results if "description" in r]
-        return snippets[:max_snippets]
-    except Exception as e:
-        print(f"Error parsing Brave results: {e}")
-        return []
+# Identical concurrent requests (same flight/date, query or prompt) share a
+# single upstream call, and /compensation clients share a single LLM stream.
+in_flight = SingleFlight()
+llm_streams = StreamGroup()
+# (start, end, scope) -> reliability summary for the reason prompt
+reliability_cache = TTLCache(4096, RELIABILITY_CACHE_TTL)
 
 
-def get_flight_details(flight_number: str, date: str, cancellation_reason_flag: bool):
-    url = f"https://aerodatabox.p.rapidapi.com/flights/number/{flight_number}/{date}"
-    headers = {"x-rapidapi-key": RAPIDAPI_KEY, "x-rapidapi-host": RAPIDAPI_HOST}
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        raise Exception(
-            f"Error fetching flight details: {response.status_code} {response.text}"
+async def get_flight_details(
+    flight_number: str, date: str, cancellation_reason_flag: bool
+):
+    with metrics.span("get_flight_details"):
+        flight_details = await in_flight.do(
+            ("details", flight_number.upper(), date),
+            _get_flight_details,
+            flight_number,
+            date,
         )
 
-    data = response.json()
-    flights = data or []
+    cancellation_reason = "No reason available"
+    if cancellation_reason_flag:
+        context = await gather_reason_context(flight_number, date, flight_details)
+        if context is not None:
+            web_snippets, flight_stats = context
+            try:
+                cancellation_reason = await asyncio.wait_for(
+                    infer_cancellation_reason(
+                        flight_details, web_snippets, flight_stats=flight_stats
+                    ),
+                    LLM_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                print(f"[LLM Timeout] cancellation reason for {flight_number} {date}")
+
+    return {**flight_details, "cancellation_reason": cancellation_reason}
+
+
+async def warm_flight(flight_number: str, date: str):
+    """
+    Fills the details, stats, search and completion caches for a flight, as
+    the /cancellation-reason endpoint would. Used by the prefetch worker.
+    """
+    await get_flight_details(flight_number, date, True)
+
+
+async def _get_flight_details(flight_number: str, date: str):
+    # One range fetch covers both the target day and its 7-day history.
+    window = await asyncio.wait_for(
+        aerodatabox.fetch_flight_window(flight_number, date), FLIGHT_DATA_TIMEOUT
+    )
+    flights = aerodatabox.flights_on_day(window, date)
 
     if not flights:
         raise Exception("No flight data found.")
@@ -77,6 +169,8 @@ def get_flight_details(flight_number: str, date: str, cancellation_reason_flag:
     flight = flights[0]
 
     flight_name = flight.get("airline", {}).get("name", "Unknown")
+    airline_iata = flight.get("airline", {}).get("iata", "")
+    airline_icao = flight.get("airline", {}).get("icao", "")
     source = flight.get("departure", {}).get("airport", {}).get("iata", "Unknown")
     destination = flight.get("arrival", {}).get("airport", {}).get("iata", "Unknown")
 
@@ -87,58 +181,92 @@ def get_flight_details(flight_number: str, date: str, cancellation_reason_flag:
         flight.get("departure", {}).get("runwayTime", {}).get("local", "Unknown")
     )
     status = flight.get("status", "Unknown")
-    cancellation_reason = "No reason available"
-    if cancellation_reason_flag:
-        flight_stats = fetch_flight_stats(flight_number, date)
-        if "cancel" in status.lower():
-            query = f"{flight_name} flight cancellation reason {date}"
-            brave_response = query_brave_search(query)
-            web_snippets = extract_brave_snippets(brave_response)
-
-            cancellation_reason = infer_cancellation_reason(
-                {
-                    "flight_name": flight_name,
-                    "source": source,
-                    "destination": destination,
-                    "scheduled_time": scheduled_time,
-                    "actual_time": actual_time,
-                    "status": status,
-                },
-                web_snippets,
-                flight_stats=flight_stats,
-            )
-
-        if flight_stats.get("delayed") > 0:
-            print("Flight delayed")
-            query = f"{flight_name} flight delay reason {date}"
-            brave_response = query_brave_search(query)
-            web_snippets = extract_brave_snippets(brave_response)
-
-            cancellation_reason = infer_cancellation_reason(
-                {
-                    "flight_name": flight_name,
-                    "source": source,
-                    "destination": destination,
-                    "scheduled_time": scheduled_time,
-                    "actual_time": actual_time,
-                    "status": status,
-                },
-                web_snippets,
-                flight_stats=flight_stats,
-            )
-
-    return {
+    flight_details = {
         "flight_name": flight_name,
+        "airline_iata": airline_iata,
+        "airline_icao": airline_icao,
         "source": source,
         "destination": destination,
         "scheduled_time": scheduled_time,
         "actual_time": actual_time,
         "status": status,
-        "cancellation_reason": cancellation_reason,
+        "delay_minutes": aerodatabox.departure_delay_minutes(flight),
+        "overnight": aerodatabox.departs_overnight(flight),
     }
+    return flight_details
+
+
+async def gather_reason_context(
+    flight_number: str, date: str, flight_details, flight_stats=None
+):
+    """
+    Returns (web_snippets, flight_stats) for explaining the disruption, or None
+    when the flight has nothing to explain. flight_stats is fetched unless the
+    caller already has it, and is not modified.
+    """
+    if flight_stats is None:
+        # The window is already cached from the details fetch.
+        flight_stats = await fetch_flight_stats(flight_number, date)
+    flight_stats = dict(flight_stats)
+    disruptions = web_context.disruptions_for(flight_details, flight_stats)
+    if not disruptions:
+        return None
+    # Snippets are shared by every flight of the airline on that day, which
+    # also keeps prefetched and live prompts (and their cache keys) alike.
+    web_snippets, reliability = await asyncio.gather(
+        web_context.gather_snippets(flight_details, date, disruptions),
+        route_and_airline_reliability(flight_details, date),
+    )
+    flight_stats.update(reliability)
+    return web_snippets, flight_stats
+
 
+async def _reliability_summary(start: str, end: str, **scope):
+    # A missing key would drop its filter and summarize every stored flight.
+    if not all(value and value != "Unknown" for value in scope.values()):
+        return None
+    key = (start, end, tuple(sorted(scope.items())))
+    summary = reliability_cache.get(key)
+    if summary is None:
+        summary = await in_flight.do(
+            ("reliability", key), _load_reliability, key, start, end, scope
+        )
+    return summary
+
+
+async def _load_reliability(key, start: str, end: str, scope):
+    summary = (await analytics.reliability(start, end, **scope))["summary"]
+    reliability_cache.set(key, summary)
+    return summary
+
+
+async def route_and_airline_reliability(flight_details, date: str):
+    # Read from the local history store only; no upstream calls are made here.
+    start, end = aerodatabox.window_bounds(date, RELIABILITY_CONTEXT_DAYS)
+    route, airline = await asyncio.gather(
+        _reliability_summary(
+            start,
+            end,
+            origin=flight_details["source"],
+            destination=flight_details["destination"],
+        ),
+        _reliability_summary(start, end, airline=flight_details["airline_iata"]),
+    )
+    return {"route_reliability": route, "airline_reliability": airline}
+
+
+def prompt_flight_fields(flight_details):
+    # Only the fields that appear in the prompts take part in the cache key.
+    fields = ("flight_name", "source", "destination", "scheduled_time", "actual_time")
+    normalized = {field: flight_details[field] for field in fields}
+    normalized["status"] = flight_details["status"].lower()
+    return normalized
+
+
+def build_prompt(flight_details, policy, eligibility=None):
+    if eligibility is not None:
+        return build_phrasing_prompt(flight_details, eligibility)
 
-def build_prompt(flight_details, policy):
     prompt = (
         "You are an assistant that determines if a passenger is eligible for benefits based on airline compensation policies. "
         "Review the flight details and the compensation policy below to decide if the passenger qualifies for any benefits (compensation, rebooking, refund, voucher, meals, hotel, etc.). "
@@ -157,22 +285,117 @@ def build_prompt(flight_details, policy):
     return prompt
 
 
-def infer_cancellation_reason(flight_details, web_snippets=None, flight_stats=None):
-    snippet_text = "\n".join(web_snippets or [])
+def build_phrasing_prompt(flight_details, eligibility):
+    prompt = (
+        "You are an assistant that explains airline compensation eligibility to passengers. "
+        "The eligibility decision below has already been determined from the airline's policy; do not change it or add benefits that are not listed. "
+        "Phrase it as a direct answer that includes the airline name and the relevant details (with dates/times formatted nicely, e.g., 'April 12, 2025 at 6:05 PM local time'). \n\n"
+        f"Flight Details:\n"
+        f"- Airline: {flight_details['flight_name']}\n"
+        f"- From: {flight_details['source']}\n"
+        f"- To: {flight_details['destination']}\n"
+        f"- Scheduled Departure: {flight_details['scheduled_time']}\n"
+        f"- Actual Departure: {flight_details['actual_time']}\n"
+        f"- Status: {flight_details['status']}\n\n"
+        f"Eligibility Decision:\n{render_eligibility(eligibility)}\n\n"
+        "Provide the final answer in 2–4 sentences without any extra sections or repeated information."
+    )
+    return prompt
+
+
+def render_reliability(label: str, summary):
+    if not summary or not summary["total_flights"]:
+        return ""
+    p90 = summary["delay_percentiles"].get("p90")
+    text = (
+        f"{label} reliability over the past {RELIABILITY_CONTEXT_DAYS} days "
+        f"({summary['total_flights']} flights): "
+        f"{summary['on_time_rate']:.0%} on time, "
+        f"{summary['delay_rate']:.0%} delayed, "
+        f"{summary['cancellation_rate']:.0%} cancelled"
+    )
+    if p90 is not None:
+        text += f", 90th percentile delay {p90:.0f} minutes"
+    return f"- {text}\n"
+
+
+def reliability_key(summary):
+    """
+    The reliability figures a cached reason may be reused across: rates to
+    the nearest RELIABILITY_KEY_STEP and no flight counts, which change with
+    every flight the history store takes in.
+    """
+    if not summary or not summary["total_flights"]:
+        return None
+    return tuple(
+        round(summary[rate] / RELIABILITY_KEY_STEP)
+        for rate in ("on_time_rate", "delay_rate", "cancellation_rate")
+    )
+
+
+def render_flight_history(flight_stats):
+    text = (
+        f"Flight history over the past 7 days:\n"
+        f"- Total Flights: {flight_stats.get('total_flights', 0)}\n"
+        f"- On Time: {flight_stats.get('on_time', 0)}\n"
+        f"- Delayed: {flight_stats.get('delayed', 0)}\n"
+        f"- Cancelled: {flight_stats.get('cancelled', 0)}\n"
+    )
+    if flight_stats.get("avg_delay_minutes"):
+        text += f"- Avg Delay: {flight_stats['avg_delay_minutes']} minutes\n"
+    return text
+
+
+def record_prompt(template: str, prompt: str, dropped_tokens: int = 0):
+    """
+    Reports the prompt's estimated size (and what the budget left out) to
+    /metrics and returns the token count for the X-Prompt-Tokens header.
+    """
+    tokens = estimate_tokens(prompt)
+    metrics.prompt_tokens.observe(template, value=tokens)
+    if dropped_tokens:
+        metrics.prompt_tokens_trimmed.inc(template, amount=dropped_tokens)
+    return tokens
+
+
+def reason_query(flight_details):
+    # What a relevant snippet is likely to mention.
+    return " ".join(
+        [
+            flight_details["flight_name"],
+            flight_details["source"],
+            flight_details["destination"],
+            flight_details["status"],
+            "cancelled cancellation delayed delay reason weather crew mechanical",
+        ]
+    )
+
+
+def build_reason_prompt(flight_details, web_snippets=None, flight_stats=None):
+    """
+    Returns (prompt, cache_key, prompt_tokens). Snippets are deduplicated,
+    ranked and cut to SNIPPET_TOKEN_BUDGET before they go in.
+    """
+    web_snippets, dropped = select_snippets(
+        web_snippets or [], reason_query(flight_details)
+    )
+    snippet_text = "\n".join(web_snippets)
 
     stats_summary = ""
+    stats_key = None
     if flight_stats:
-        stats_summary = (
-            f"Flight history over the past 7 days:\n"
-            f"- Total Flights: {flight_stats.get('total_flights', 0)}\n"
-            f"- On Time: {flight_stats.get('on_time', 0)}\n"
-            f"- Delayed: {flight_stats.get('delayed', 0)}\n"
-            f"- Cancelled: {flight_stats.get('cancelled', 0)}\n"
+        stats_summary = render_flight_history(flight_stats)
+        stats_key = (
+            stats_summary,
+            reliability_key(flight_stats.get("route_reliability")),
+            reliability_key(flight_stats.get("airline_reliability")),
+        )
+        stats_summary += render_reliability(
+            "Route", flight_stats.get("route_reliability")
+        )
+        stats_summary += render_reliability(
+            "Airline", flight_stats.get("airline_reliability")
         )
-        if flight_stats.get("avg_delay_minutes"):
-            stats_summary += (
-                f"- Avg Delay: {flight_stats['avg_delay_minutes']} minutes\n"
-            )
 
     prompt = (
         "You are a knowledgeable aviation assistant. A flight was cancelled or delayed. "
@@ -188,7 +411,132 @@ def infer_cancellation_reason(flight_details, web_snippets=None, flight_stats=No
         "What is the most likely reason for the cancellation or delay? Respond in 3–4 sentences."
     )
 
-    return "".join(call_language_model(prompt)).strip()
+    cache_key = completion_key(
+        MODEL,
+        "cancellation-reason",
+        flight=prompt_flight_fields(flight_details),
+        stats=stats_key,
+        snippets=web_snippets,
+    )
+    return prompt, cache_key, record_prompt("cancellation-reason", prompt, dropped)
+
+
+async def infer_cancellation_reason(
+    flight_details, web_snippets=None, flight_stats=None
+):
+    prompt, cache_key, _ = build_reason_prompt(
+        flight_details, web_snippets, flight_stats
+    )
+    return await _complete(prompt, cache_key)
+
+
+async def _complete(prompt: str, cache_key: str):
+    # Shares the stream with live requests for the same answer.
+    chunks = [chunk async for chunk in completion_stream(prompt, cache_key)]
+    return "".join(chunks).strip()
+
+
+def busy_response(error):
+    # UpstreamBusy or Overloaded: both say when to come back.
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(error)},
+        headers={"Retry-After": str(math.ceil(error.retry_after))},
+    )
+
+
+async def text_stream(text: str):
+    yield text
+
+
+async def admit_llm_or_degrade(endpoint: str):
+    """
+    Returns (admission, degraded). When the LLM endpoints are at capacity
+    the request is admitted as a data request instead and answered without
+    the LLM. Raises Overloaded only when both classes are full.
+    """
+    try:
+        return await admit("llm"), False
+    except Overloaded:
+        admission = await admit("data")
+        metrics.admission_degraded.inc(endpoint)
+        return admission, True
+
+
+def stream_headers(prompt_tokens: int, degraded: bool):
+    headers = {"X-Prompt-Tokens": str(prompt_tokens)}
+    if degraded:
+        headers["X-Degraded"] = "true"
+    return headers
+
+
+async def timed_stream(stream, endpoint: str, started: float):
+    first = True
+    async for chunk in stream:
+        if first:
+            first = False
+            metrics.ttfb_seconds.observe(
+                endpoint, value=time.perf_counter() - started
+            )
+        yield chunk
+
+
+async def _resume(first, stream):
+    yield first
+    async for chunk in stream:
+        yield chunk
+
+
+async def started_stream(stream):
+    """
+    Waits for the stream's first chunk, so that a failure before any output
+    (UpstreamBusy from the Groq scheduler, a failed request) is raised while
+    an error status can still be sent. Returns the stream from that chunk.
+    """
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        return text_stream("")
+    return _resume(first, stream)
+
+
+def completion_stream(prompt: str, cache_key: str):
+    # Tokens go straight from Groq to the client as they arrive, and clients
+    # asking for the same answer share one stream.
+    return llm_streams.subscribe(
+        cache_key, lambda: stream_completion(prompt, cache_key)
+    )
+
+
+def rules_only_reason(flight_details, flight_stats):
+    return (
+        "A detailed explanation is not available right now. "
+        f"The flight's status is {flight_details['status']}.\n\n"
+        + render_flight_history(flight_stats)
+    )
+
+
+async def reason_stream(
+    flight_number: str, date: str, flight_details, stats=None, degraded=False
+):
+    """
+    Returns (stream, prompt_tokens) for the cancellation/delay explanation.
+    Degraded requests get the flight's status and history without a web
+    search or LLM call.
+    """
+    if degraded:
+        if stats is None:
+            stats = await fetch_flight_stats(flight_number, date)
+        return text_stream(rules_only_reason(flight_details, stats)), 0
+    context = await gather_reason_context(flight_number, date, flight_details, stats)
+    if context is None:
+        return text_stream("No reason available"), 0
+    web_snippets, flight_stats = context
+    with metrics.span("build_prompt"):
+        prompt, cache_key, prompt_tokens = build_reason_prompt(
+            flight_details, web_snippets, flight_stats
+        )
+    return completion_stream(prompt, cache_key), prompt_tokens
 
 
 @app.get("/cancellation-reason")
@@ -196,157 +544,493 @@ async def get_cancellation_reason(
     flight_number: str = Query(..., description="Flight number (e.g., DL324)"),
     date: str = Query(..., description="Flight date in YYYY-MM-DD format"),
 ):
+    started = time.perf_counter()
+    try:
+        admission, degraded = await admit_llm_or_degrade("/cancellation-reason")
+    except Overloaded as e:
+        return busy_response(e)
     try:
-        flight_details = get_flight_details(flight_number, date, True)
-        structured_reason = flight_details.get(
-            "cancellation_reason", "No reason available"
+        flight_details = await get_flight_details(flight_number, date, False)
+        stream, prompt_tokens = await reason_stream(
+            flight_number, date, flight_details, degraded=degraded
         )
-
-        # Wrap the text as a generator to stream word-by-word
-        def word_stream(text):
-            for word in text.split():
-                yield word + " "
-                time.sleep(0.03)  # smooth typing effect
-
-        return StreamingResponse(
-            word_stream(structured_reason), media_type="text/plain"
+        stream = await started_stream(stream)
+        return AdmittedResponse(
+            admission,
+            timed_stream(stream, "/cancellation-reason", started),
+            media_type="text/plain",
+            headers=stream_headers(prompt_tokens, degraded),
         )
 
+    except UpstreamBusy as e:
+        admission.abort(e)
+        return busy_response(e)
     except Exception as e:
+        admission.abort(e)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
+def assess_compensation(flight_details):
+    """
+    Returns (airline_policy, policy_text, eligibility) for a flight. Most
+    answers follow directly from the policy rules, so eligibility is decided
+    locally and the LLM is left only the phrasing.
+    """
+    # Policy text is pre-rendered when the index is built.
+    airline_policy = find_airline_policy(
+        policies.index,
+        flight_details["flight_name"],
+        flight_details["airline_iata"],
+        flight_details["airline_icao"],
+    )
+
+    if airline_policy is None:
+        return None, "No compensation policy available for this flight.", None
+
+    eligibility = evaluate_eligibility(
+        airline_policy["rules"],
+        flight_details["status"],
+        flight_details["delay_minutes"],
+        flight_details["overnight"],
+    )
+    return airline_policy, airline_policy["blocks"]["all"], eligibility
+
+
+def structured_compensation(flight_details, airline_policy, eligibility):
+    return {
+        "flight": flight_details,
+        "airline": airline_policy["airline"] if airline_policy else None,
+        "policy_version": airline_policy["version"] if airline_policy else None,
+        "eligibility": eligibility,
+    }
+
+
+def rules_only_compensation(policy, eligibility):
+    # The rule-based decision, or the policy itself when no rules apply.
+    return render_eligibility(eligibility) if eligibility is not None else policy
+
+
+def compensation_prompt(flight_details, airline_policy, policy, eligibility):
+    """
+    Returns (prompt, cache_key, prompt_tokens) for the compensation answer,
+    keeping only the clauses that fit in POLICY_TOKEN_BUDGET.
+    """
+    template = "compensation" if eligibility is None else "compensation-phrasing"
+    with metrics.span("build_prompt"):
+        dropped = 0
+        if eligibility is not None:
+            eligibility, dropped = budget_eligibility(eligibility)
+        prompt = build_prompt(flight_details, policy, eligibility)
+        prompt_tokens = record_prompt(template, prompt, dropped)
+    cache_key = completion_key(
+        MODEL,
+        template,
+        flight=prompt_flight_fields(flight_details),
+        policy_id=(
+            (airline_policy["airline"], airline_policy["version"])
+            if airline_policy
+            else None
+        ),
+        eligibility=eligibility,
+    )
+    return prompt, cache_key, prompt_tokens
+
+
 @app.get("/compensation")
 async def get_compensation(
     flight_number: str = Query(..., description="Flight number (e.g., BA2490)"),
     date: str = Query(..., description="Flight date in YYYY-MM-DD format"),
+    mode: str = Query(
+        "text",
+        description="'text' streams an LLM answer, 'structured' returns the "
+        "rule-based eligibility as JSON without calling the LLM",
+    ),
 ):
+    started = time.perf_counter()
+    try:
+        if mode == "structured":
+            admission, degraded = await admit("data"), False
+        else:
+            admission, degraded = await admit_llm_or_degrade("/compensation")
+    except Overloaded as e:
+        return busy_response(e)
     try:
         # Get flight details from AeroDataBox API
-        flight_details = get_flight_details(flight_number, date, False)
+        flight_details = await get_flight_details(flight_number, date, False)
 
-        # Get compensation policy based on flight name.
-        # The key is the flight name returned from the API.
-        flight_name = flight_details["flight_name"]
-        normalized_name = flight_name.lower()
+        with metrics.span("policy_match"):
+            airline_policy, policy, eligibility = assess_compensation(flight_details)
 
-        # Filter all policies matching that airline (case-insensitive)
-        matching_policies = [
-            p for p in policies if p["airline"].lower() == normalized_name
-        ]
+        if mode == "structured":
+            admission.release()
+            return JSONResponse(
+                content=structured_compensation(
+                    flight_details, airline_policy, eligibility
+                )
+            )
 
-        if not matching_policies:
-            policy = "No compensation policy available for this flight."
+        prompt_tokens = 0
+        if degraded:
+            stream = text_stream(rules_only_compensation(policy, eligibility))
         else:
-            all_commits = []
-            all_does_not_commit = []
-            for p in matching_policies:
-                all_commits.extend(p.get("commits", []))
-                all_does_not_commit.extend(p.get("does_not_commit", []))
-
-            policy = (
-                f"Commits:\n- "
-                + "\n- ".join(all_commits)
-                + f"\n\nDoes Not Commit:\n- "
-                + "\n- ".join(all_does_not_commit)
+            prompt, cache_key, prompt_tokens = compensation_prompt(
+                flight_details, airline_policy, policy, eligibility
             )
+            stream = await started_stream(completion_stream(prompt, cache_key))
+        return AdmittedResponse(
+            admission,
+            timed_stream(stream, "/compensation", started),
+            media_type="text/plain",
+            headers=stream_headers(prompt_tokens, degraded),
+        )
+
+    except UpstreamBusy as e:
+        admission.abort(e)
+        return busy_response(e)
+    except Exception as e:
+        admission.abort(e)
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+def sse_event(event: str, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def error_event_data(part: str, error: Exception):
+    data = {"part": part, "error": str(error)}
+    if isinstance(error, UpstreamBusy):
+        data["retry_after"] = math.ceil(error.retry_after)
+    return data
+
+
+async def flight_report_events(
+    flight_number: str, date: str, flight_details, degraded=False, on_answer=None
+):
+    """
+    Yields the report's server-sent events: details first, then stats,
+    eligibility and the two answers' tokens as each becomes ready, and
+    finally done. The parts run concurrently and share the flight lookup.
+    Degraded reports answer both parts without the LLM. on_answer() is
+    called with every answer token.
+    """
+    queue = asyncio.Queue()
+    prompt_tokens = {"compensation": 0, "reason": 0}
+    stats_task = asyncio.ensure_future(fetch_flight_stats(flight_number, date))
+
+    async def stats():
+        queue.put_nowait(("stats", await stats_task))
+
+    async def compensation():
+        with metrics.span("policy_match"):
+            airline_policy, policy, eligibility = assess_compensation(flight_details)
+        structured = structured_compensation(
+            flight_details, airline_policy, eligibility
+        )
+        del structured["flight"]
+        queue.put_nowait(("eligibility", structured))
+        if degraded:
+            stream = text_stream(rules_only_compensation(policy, eligibility))
+        else:
+            prompt, cache_key, prompt_tokens["compensation"] = compensation_prompt(
+                flight_details, airline_policy, policy, eligibility
+            )
+            stream = completion_stream(prompt, cache_key)
+        await stream_part("compensation", stream)
+
+    async def reason():
+        # Reuses the stats fetched for the stats event.
+        stream, prompt_tokens["reason"] = await reason_stream(
+            flight_number, date, flight_details, await stats_task, degraded
+        )
+        await stream_part("reason", stream)
+
+    async def stream_part(part, stream):
+        async for chunk in stream:
+            if on_answer is not None:
+                on_answer()
+            queue.put_nowait((part, {"text": chunk}))
+        queue.put_nowait(("end", {"part": part}))
+
+    async def run(part, produce):
+        try:
+            await produce()
+        except Exception as e:
+            queue.put_nowait(("error", error_event_data(part, e)))
+        finally:
+            queue.put_nowait(None)
 
-        # Build prompt for the language model
-        prompt = build_prompt(flight_details, policy)
+    parts = {"stats": stats, "compensation": compensation, "reason": reason}
+    tasks = [asyncio.ensure_future(run(part, fn)) for part, fn in parts.items()]
+    try:
+        yield sse_event("details", flight_details)
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is None:
+                remaining -= 1
+            else:
+                yield sse_event(*item)
+        yield sse_event(
+            "done", {"prompt_tokens": prompt_tokens, "degraded": degraded}
+        )
+    finally:
+        # Shared LLM streams carry on for their other subscribers and the cache.
+        for task in [stats_task, *tasks]:
+            task.cancel()
 
-        stream = call_language_model(prompt)
-        return StreamingResponse(stream, media_type="text/plain")
 
+@app.get("/flight-report")
+async def get_flight_report(
+    flight_number: str = Query(..., description="Flight number (e.g., DL324)"),
+    date: str = Query(..., description="Flight date in YYYY-MM-DD format"),
+):
+    """
+    Details, stats, eligibility and both LLM answers for one flight over a
+    single server-sent event stream, in place of three separate requests.
+    """
+    started = time.perf_counter()
+    try:
+        admission, degraded = await admit_llm_or_degrade("/flight-report")
+    except Overloaded as e:
+        return busy_response(e)
+    try:
+        flight_details = await get_flight_details(flight_number, date, False)
+    except UpstreamBusy as e:
+        admission.abort(e)
+        return busy_response(e)
     except Exception as e:
+        admission.abort(e)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
-
-def fetch_flight_stats(flight_number: str, date: str):
-    end_date = datetime.strptime(date, "%Y-%m-%d")
-    start_date = end_date - timedelta(days=7)
-    url = (
-        f"https://aerodatabox.p.rapidapi.com/flights/number/{flight_number}/"
-        f"{start_date.date()}/{end_date.date()}?dateLocalRole=Both"
+    # The details event goes out at once, so the limit follows the first
+    # answer token instead.
+    events = flight_report_events(
+        flight_number, date, flight_details, degraded, admission.mark_output
+    )
+    return AdmittedResponse(
+        admission,
+        timed_stream(events, "/flight-report", started),
+        timed=False,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    headers = {"x-rapidapi-key": RAPIDAPI_KEY, "x-rapidapi-host": RAPIDAPI_HOST}
 
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        raise Exception(f"Failed to fetch historical data: {response.status_code}")
+class FlightQuery(BaseModel):
+    flight_number: str
+    date: str
 
-    flights = response.json() or []
 
-    stats = {
-        "total_flights": 0,
-        "on_time": 0,
-        "delayed": 0,
-        "cancelled": 0,
-        "avg_delay_minutes": 0.0,
-        "details": [],
-    }
+class CompensationBatch(BaseModel):
+    flights: List[FlightQuery]
+
 
-    total_delay = 0
-    for flight in flights:
-        stats["total_flights"] += 1
-        status = flight.get("status", "").lower()
-        flight_date = (
-            flight.get("departure", {}).get("scheduledTime", {}).get("local", "Unknown")
+@app.post("/compensation/batch")
+async def post_compensation_batch(batch: CompensationBatch):
+    # Duplicate bookings on the same flight are only checked once.
+    pairs = list(
+        dict.fromkeys((f.flight_number.strip().upper(), f.date) for f in batch.flights)
+    )
+    if len(pairs) > MAX_BATCH_SIZE:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"Batch exceeds {MAX_BATCH_SIZE} distinct flights."},
         )
 
-        if status == "canceled":
-            stats["cancelled"] += 1
-            stats["details"].append(
-                {"date": flight_date, "status": "Cancelled", "delay_minutes": None}
-            )
-            continue
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
 
-        sched = flight.get("departure", {}).get("scheduledTime", {}).get("utc")
-        actual = flight.get("departure", {}).get("runwayTime", {}).get("utc")
-        if sched and actual:
-            sched_time = datetime.strptime(sched, "%Y-%m-%d %H:%MZ")
-            actual_time = datetime.strptime(actual, "%Y-%m-%d %H:%MZ")
-            delay_min = (actual_time - sched_time).total_seconds() / 60
+    async def check(flight_number, date):
+        # Batch work queues behind interactive requests for upstream quota.
+        request_priority.set(PRIORITY_BATCH)
+        async with semaphore:
+            try:
+                # Each flight takes a data slot, like a structured /compensation.
+                async with await admit("data"):
+                    flight_details = await get_flight_details(
+                        flight_number, date, False
+                    )
+                    airline_policy, _, eligibility = assess_compensation(
+                        flight_details
+                    )
+                result = structured_compensation(
+                    flight_details, airline_policy, eligibility
+                )
+            except (UpstreamBusy, Overloaded) as e:
+                result = {"error": str(e), "retry_after": math.ceil(e.retry_after)}
+            except Exception as e:
+                result = {"error": str(e)}
+        return {"flight_number": flight_number, "date": date, **result}
 
-            if delay_min > 15:
-                stats["delayed"] += 1
-            else:
-                stats["on_time"] += 1
-
-            total_delay += delay_min
-            stats["details"].append(
-                {
-                    "date": flight_date,
-                    "status": "Delayed" if delay_min > 15 else "On Time",
-                    "delay_minutes": round(delay_min),
-                }
-            )
-        else:
-            stats["details"].append(
-                {
-                    "date": flight_date,
-                    "status": "Unknown (missing times)",
-                    "delay_minutes": None,
-                }
-            )
+    async def results():
+        tasks = [asyncio.ensure_future(check(*pair)) for pair in pairs]
+        try:
+            # Each line is sent as soon as its flight finishes.
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
-    if stats["delayed"] > 0:
-        stats["avg_delay_minutes"] = round(total_delay / stats["delayed"], 2)
 
-    return stats
+async def fetch_flight_stats(
+    flight_number: str, date: str, days: int = aerodatabox.HISTORY_DAYS
+):
+    with metrics.span("fetch_flight_stats"):
+        # Tops up only the days the local history store is missing, then
+        # aggregates the window there with indexed queries.
+        await aerodatabox.fetch_flight_window(flight_number, date, days)
+        start, end = aerodatabox.window_bounds(date, days)
+        return await flight_history.flight_stats(flight_number.upper(), start, end)
 
 
 @app.get("/flight-stats")
 async def get_flight_stats(
     flight_number: str = Query(..., description="Flight number (e.g., DL324)"),
     date: str = Query(..., description="Flight date in YYYY-MM-DD format"),
+    days: int = Query(
+        aerodatabox.HISTORY_DAYS,
+        ge=1,
+        le=MAX_HISTORY_DAYS,
+        description="Number of days of history before the flight date",
+    ),
 ):
     try:
-        stats = fetch_flight_stats(flight_number, date)
+        async with await admit("data"):
+            stats = await fetch_flight_stats(flight_number, date, days)
         return JSONResponse(content=stats)
+    except (UpstreamBusy, Overloaded) as e:
+        return busy_response(e)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@app.get("/reliability")
+async def get_reliability(
+    start: str = Query(..., description="First day in YYYY-MM-DD format"),
+    end: str = Query(..., description="Last day in YYYY-MM-DD format"),
+    flight_number: str = Query(None, description="Comma-separated flight numbers"),
+    airline: str = Query(None, description="Airline IATA code (e.g., DL)"),
+    origin: str = Query(None, description="Departure airport IATA code"),
+    destination: str = Query(None, description="Arrival airport IATA code"),
+    group_by: str = Query(None, description="flight_number, airline, route or day"),
+):
+    """
+    On-time, delay and cancellation rates plus delay percentiles and
+    distribution over the locally stored flight history.
+    """
+    flight_numbers = [f.strip() for f in (flight_number or "").split(",") if f.strip()]
+    if not (flight_numbers or airline or origin or destination):
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Pass flight_number, airline, origin or destination."},
+        )
+    try:
+        span = (
+            datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")
+        ).days
+    except ValueError:
+        return JSONResponse(
+            status_code=400, content={"error": "start and end must be YYYY-MM-DD."}
+        )
+    if not 0 <= span < MAX_RELIABILITY_DAYS:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "error": f"end must be on or after start and within "
+                f"{MAX_RELIABILITY_DAYS} days of it."
+            },
+        )
+    if group_by and group_by not in analytics.GROUP_FIELDS:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"group_by must be one of {analytics.GROUP_FIELDS}"},
+        )
+    try:
+        async with await admit("data"):
+            with metrics.span("reliability"):
+                result = await analytics.reliability(
+                    start,
+                    end,
+                    flight_numbers=flight_numbers,
+                    airline=airline,
+                    origin=origin,
+                    destination=destination,
+                    group_by=group_by,
+                )
+        return JSONResponse(content=result)
+    except Overloaded as e:
+        return busy_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
+@app.post("/admin/reload-policies")
+async def reload_policies(x_admin_token: str = Header(None)):
+    """
+    Swaps in the current policy file without a restart. In-flight requests
+    finish on the snapshot they started with.
+    """
+    if not ADMIN_TOKEN:
+        return JSONResponse(
+            status_code=404, content={"error": "Set ADMIN_TOKEN to enable."}
+        )
+    if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        return JSONResponse(status_code=403, content={"error": "Invalid admin token."})
+    try:
+        return JSONResponse(content=await policies.reload(force=True))
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+def collect_runtime_metrics():
+    caches = {
+        "flight_days": aerodatabox.day_cache.stats(),
+        "llm_completions": completion_cache.stats(),
+        "web_context": web_context.context_cache.stats(),
+        "reliability": reliability_cache.stats(),
+    }
+    collected = {
+        f"skysettle_cache_{field}": (
+            f"Cache {field.replace('_', ' ')}",
+            [({"cache": name}, stats[field]) for name, stats in caches.items()],
+        )
+        for field in ("hits", "misses", "hit_ratio", "size")
+    }
+    collected["skysettle_coalesced_in_flight"] = (
+        "Shared upstream calls and LLM streams currently in flight",
+        [
+            ({"kind": "calls"}, in_flight.in_flight()),
+            ({"kind": "llm_streams"}, llm_streams.in_flight()),
+        ],
+    )
+    for field in ("limit", "in_flight", "queued"):
+        collected[f"skysettle_admission_{field}"] = (
+            f"Admission {field.replace('_', ' ')} per endpoint class",
+            [
+                ({"endpoint_class": name}, limiter.stats()[field])
+                for name, limiter in limiters.items()
+            ],
+        )
+    collected["skysettle_upstream_queued"] = (
+        "Upstream calls waiting for quota",
+        [({"provider": name}, s.stats()["queued"]) for name, s in schedulers.items()],
+    )
+    return collected
+
+
+metrics.register_collector(collect_runtime_metrics)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    if not metrics.ENABLED:
+        return JSONResponse(
+            status_code=404, content={"error": "Set METRICS_ENABLED=true to enable."}
+        )
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
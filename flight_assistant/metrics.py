@@ -0,0 +1,237 @@
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+# Instrumentation is a no-op unless enabled, so the hot path pays nothing when
+# nobody scrapes /metrics.
+ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+TOKEN_BUCKETS = (100, 200, 400, 600, 800, 1200, 1600, 2400, 3200)
+
+_registry = []
+_collectors = []
+_NULL_SPAN = nullcontext()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def _header(self):
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        if ENABLED:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = self._header()
+        for labels, value in self._values.items():
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}{label_text} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        if ENABLED:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value: float):
+        if not ENABLED:
+            return
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = entry[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self):
+        lines = self._header()
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                label_text = _format_labels(self.labelnames, labels, [("le", bound)])
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{label_text} {count}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+stage_seconds = Histogram(
+    "skysettle_stage_duration_seconds", "Time spent per pipeline stage", ["stage"]
+)
+upstream_in_flight = Gauge(
+    "skysettle_upstream_in_flight", "Upstream requests currently open", ["provider"]
+)
+upstream_requests = Counter(
+    "skysettle_upstream_requests_total", "Upstream requests sent", ["provider"]
+)
+upstream_seconds = Histogram(
+    "skysettle_upstream_duration_seconds", "Upstream request duration", ["provider"]
+)
+ttfb_seconds = Histogram(
+    "skysettle_time_to_first_byte_seconds",
+    "Time from request to the first streamed response chunk",
+    ["endpoint"],
+)
+llm_ttft_seconds = Histogram(
+    "skysettle_llm_time_to_first_token_seconds", "LLM time to first token", ["model"]
+)
+llm_tokens_per_second = Histogram(
+    "skysettle_llm_tokens_per_second",
+    "LLM streaming rate after the first token",
+    ["model"],
+    buckets=RATE_BUCKETS,
+)
+llm_tokens = Counter(
+    "skysettle_llm_completion_tokens_total", "Streamed LLM tokens", ["model"]
+)
+llm_served = Counter(
+    "skysettle_llm_served_total",
+    "LLM answers by the path that served them (primary, hedge, fallback, cache)",
+    ["path", "model"],
+)
+llm_hedges = Counter(
+    "skysettle_llm_hedges_total",
+    "Hedged or fallback LLM requests started after a late first token",
+    ["path"],
+)
+prompt_tokens = Histogram(
+    "skysettle_prompt_tokens",
+    "Estimated input tokens per prompt built",
+    ["template"],
+    buckets=TOKEN_BUCKETS,
+)
+prompt_tokens_trimmed = Counter(
+    "skysettle_prompt_tokens_trimmed_total",
+    "Estimated tokens left out of prompts by dedupe and the token budget",
+    ["template"],
+)
+llm_prompt_tokens = Histogram(
+    "skysettle_llm_prompt_tokens",
+    "Prompt tokens reported by the LLM provider",
+    ["model"],
+    buckets=TOKEN_BUCKETS,
+)
+admission_rejected = Counter(
+    "skysettle_admission_rejected_total",
+    "Requests turned away by admission control",
+    ["endpoint_class", "reason"],
+)
+admission_degraded = Counter(
+    "skysettle_admission_degraded_total",
+    "LLM requests answered without the LLM because its endpoints were full",
+    ["endpoint"],
+)
+prefetch_flights = Counter(
+    "skysettle_prefetch_flights_total",
+    "Disrupted flights handled by the prefetch worker",
+    ["outcome"],
+)
+
+
+@contextmanager
+def _span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(stage, value=time.perf_counter() - started)
+
+
+def span(stage: str):
+    """
+    Times a pipeline stage into skysettle_stage_duration_seconds.
+    """
+    if not ENABLED:
+        return _NULL_SPAN
+    return _span(stage)
+
+
+@contextmanager
+def _track_upstream(provider: str):
+    upstream_requests.inc(provider)
+    upstream_in_flight.inc(provider)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        upstream_in_flight.dec(provider)
+        upstream_seconds.observe(provider, value=time.perf_counter() - started)
+
+
+def track_upstream(provider: str):
+    if not ENABLED:
+        return _NULL_SPAN
+    return _track_upstream(provider)
+
+
+def register_collector(collect):
+    """
+    Registers a callable that returns {metric_name: (help, [(labels, value)])}
+    gauges computed at scrape time, e.g. cache hit ratios.
+    """
+    _collectors.append(collect)
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        for name, (help_text, samples) in collect().items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                label_text = _format_labels(labels.keys(), labels.values())
+                lines.append(f"{name}{label_text} {value}")
+    return "\n".join(lines) + "\n"
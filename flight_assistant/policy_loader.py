@@ -1,4 +1,30 @@
+import asyncio
+import hashlib
 import json
+import os
+import re
+import time
+from types import MappingProxyType
+
+from flight_assistant.rules import parse_rules
+
+# IATA/ICAO codes and the name variants AeroDataBox or users may send for each
+# airline in the DOT dashboard.
+AIRLINE_ALIASES = {
+    "Alaska Airlines": ["Alaska", "AS", "ASA"],
+    "Allegiant Air": ["Allegiant", "G4", "AAY"],
+    "American Airlines": ["American", "AA", "AAL"],
+    "Delta Air Lines": ["Delta", "Delta Airlines", "DL", "DAL"],
+    "Frontier Airlines": ["Frontier", "F9", "FFT"],
+    "Hawaiian Airlines": ["Hawaiian", "HA", "HAL"],
+    "JetBlue Airways": ["JetBlue", "Jet Blue", "B6", "JBU"],
+    "Southwest Airlines": ["Southwest", "WN", "SWA"],
+    "Spirit Airlines": ["Spirit", "NK", "NKS"],
+    "United Airlines": ["United", "UA", "UAL"],
+}
+
+_GENERIC_SUFFIXES = ("air lines", "airlines", "airline", "airways", "air", "inc")
+
 
 def load_policies(file_path: str):
     try:
@@ -8,3 +34,198 @@ def load_policies(file_path: str):
     except Exception as e:
         print(f"Error loading policies: {e}")
         return {}
+
+
+def normalize_airline(name: str):
+    name = (name or "").lower().replace("&", " and ")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", name).split())
+
+
+def _strip_suffix(key: str):
+    for suffix in _GENERIC_SUFFIXES:
+        if key.endswith(" " + suffix):
+            return key[: -len(suffix) - 1]
+    return key
+
+
+def render_policy(commits, does_not_commit):
+    return (
+        f"Commits:\n- "
+        + "\n- ".join(commits)
+        + f"\n\nDoes Not Commit:\n- "
+        + "\n- ".join(does_not_commit)
+    )
+
+
+def build_policy_index(policies):
+    """
+    Groups the scraped policy cards by airline, parses the commitments into
+    rules and pre-renders the policy text for each policy_type (plus "all",
+    every card merged). Returns a read-only mapping from every normalized name,
+    variant and code to the airline entry.
+    """
+    grouped = {}
+    for p in policies:
+        airline = p.get("airline", "")
+        cards = grouped.setdefault(airline, [])
+        cards.append(p)
+
+    index = {}
+    for airline, cards in grouped.items():
+        by_type = {}
+        for p in cards:
+            commits, does_not_commit = by_type.setdefault(
+                p.get("policy_type", ""), ([], [])
+            )
+            commits.extend(p.get("commits", []))
+            does_not_commit.extend(p.get("does_not_commit", []))
+
+        all_commits = [c for p in cards for c in p.get("commits", [])]
+        all_does_not_commit = [c for p in cards for c in p.get("does_not_commit", [])]
+        blocks = {t: render_policy(c, d) for t, (c, d) in by_type.items()}
+        blocks["all"] = render_policy(all_commits, all_does_not_commit)
+        rules = tuple(
+            rule for t, (c, d) in by_type.items() for rule in parse_rules(t, c, d)
+        )
+
+        # Changes whenever any of this airline's cards change, so cached answers
+        # can be keyed per airline instead of per policy file.
+        version = hashlib.sha256(
+            json.dumps(cards, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:12]
+
+        entry = MappingProxyType(
+            {
+                "airline": airline,
+                "version": version,
+                "policies": MappingProxyType(
+                    {
+                        t: MappingProxyType(
+                            {"commits": tuple(c), "does_not_commit": tuple(d)}
+                        )
+                        for t, (c, d) in by_type.items()
+                    }
+                ),
+                "blocks": MappingProxyType(blocks),
+                "rules": rules,
+            }
+        )
+
+        names = [airline] + AIRLINE_ALIASES.get(airline, [])
+        for name in names:
+            key = normalize_airline(name)
+            index.setdefault(key, entry)
+            index.setdefault(_strip_suffix(key), entry)
+
+    return MappingProxyType(index)
+
+
+def load_policy_index(file_path: str):
+    return build_policy_index(load_policies(file_path))
+
+
+def _airline_versions(index):
+    return {entry["airline"]: entry["version"] for entry in index.values()}
+
+
+class PolicyStore:
+    """
+    Holds the current policy snapshot and swaps in a rebuilt one when the
+    policy file changes. Snapshots are immutable and requests read `index`
+    once, so a reload never blocks or alters a request already in flight.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index = MappingProxyType({})
+        self.version = None
+        self.loaded_at = None
+        self._stamp = None
+        self._lock = asyncio.Lock()
+        self._task = None
+        try:
+            self._swap(*self._read())
+        except (OSError, ValueError) as e:
+            print(f"Error loading policies: {e}")
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self):
+        stamp = self._file_stamp()
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        index = build_policy_index(json.loads(raw))
+        return stamp, hashlib.sha256(raw).hexdigest()[:12], index
+
+    def _swap(self, stamp, version, index):
+        # A single assignment per field with no await in between; readers see
+        # either the old snapshot or the new one.
+        self.index, self.version = index, version
+        self._stamp, self.loaded_at = stamp, time.time()
+
+    async def reload(self, force: bool = False):
+        """
+        Rebuilds the index off the event loop if the file changed (or force is
+        set). Returns the snapshot version and the airlines whose policy
+        changed. A malformed file, or one with no policies, keeps the current
+        snapshot.
+        """
+        async with self._lock:
+            try:
+                if not force and self._file_stamp() == self._stamp:
+                    return {"version": self.version, "changed": []}
+                stamp, version, index = await asyncio.to_thread(self._read)
+                if not index and self.index:
+                    raise ValueError("policy file has no airline policies")
+            except (OSError, ValueError) as e:
+                print(f"Error reloading policies: {e}")
+                raise
+            before, after = _airline_versions(self.index), _airline_versions(index)
+            changed = sorted(
+                airline
+                for airline in set(before) | set(after)
+                if before.get(airline) != after.get(airline)
+            )
+            self._swap(stamp, version, index)
+            if changed:
+                print(f"[Policies] Loaded {version}, changed: {', '.join(changed)}")
+            return {"version": version, "changed": changed}
+
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload()
+            except (OSError, ValueError):
+                pass
+
+    def start_watching(self, interval: float):
+        if self._task is None and interval > 0:
+            self._task = asyncio.create_task(self._watch(interval))
+
+    async def stop_watching(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+def find_airline_policy(index, *names):
+    """
+    Returns the entry for the first name (airline name, IATA or ICAO code) that
+    matches, or None.
+    """
+    for name in names:
+        key = normalize_airline(name)
+        if not key:
+            continue
+        entry = index.get(key) or index.get(_strip_suffix(key))
+        if entry is not None:
+            return entry
+    return None
@@ -0,0 +1,210 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from flight_assistant import aerodatabox, metrics
+from flight_assistant.cache import TTLCache
+from flight_assistant.history_store import flight_history
+from flight_assistant.scheduler import PRIORITY_PREFETCH, request_priority, schedulers
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Comma-separated entries such as "airport:JFK,airline:DL,flight:DL324".
+PREFETCH_WATCHLIST = os.getenv("PREFETCH_WATCHLIST", "")
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "300"))
+# Watchlist lookups (one AeroDataBox call each) per cycle.
+PREFETCH_MAX_POLLS = int(os.getenv("PREFETCH_MAX_POLLS", "20"))
+# Disrupted flights warmed per cycle. Each costs roughly one AeroDataBox,
+# two Brave and one Groq call on a cold cache.
+PREFETCH_BUDGET = int(os.getenv("PREFETCH_BUDGET", "10"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+# Departure delays at least this long count as a disruption worth warming.
+PREFETCH_DELAY_MINUTES = float(os.getenv("PREFETCH_DELAY_MINUTES", "60"))
+# Airlines are watched through the flight numbers seen for them recently.
+AIRLINE_LOOKBACK_DAYS = 2
+WARMED_TTL = 6 * 3600
+
+WATCH_KINDS = ("airport", "airline", "flight")
+
+
+def parse_watchlist(text: str):
+    """
+    Parses "kind:value" entries into (kind, VALUE) pairs, skipping (and
+    logging) anything that isn't an airport, airline or flight.
+    """
+    entries = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        kind, _, value = item.partition(":")
+        kind, value = kind.strip().lower(), value.strip().upper()
+        if kind not in WATCH_KINDS or not value:
+            print(f"[Prefetch] Ignoring watchlist entry {item!r}")
+            continue
+        if (kind, value) not in entries:
+            entries.append((kind, value))
+    return entries
+
+
+def _is_disrupted(status: str, delay_minutes):
+    if "cancel" in (status or "").lower():
+        return True
+    return delay_minutes is not None and delay_minutes >= PREFETCH_DELAY_MINUTES
+
+
+def _board_disruption(entry):
+    # Board entries carry the departure times under "movement".
+    movement = entry.get("movement", {})
+    flight_number = entry.get("number", "").replace(" ", "").upper()
+    date = movement.get("scheduledTime", {}).get("local", "")[:10]
+    if not flight_number or not date:
+        return None
+    status = entry.get("status", "")
+    delay = aerodatabox.departure_delay_minutes({"departure": movement})
+    if not _is_disrupted(status, delay):
+        return None
+    return flight_number, date, status
+
+
+def _flight_disruption(flight_number: str, flight):
+    status = flight.get("status", "")
+    delay = aerodatabox.departure_delay_minutes(flight)
+    date = flight.get("departure", {}).get("scheduledTime", {}).get("local", "")[:10]
+    if not date or not _is_disrupted(status, delay):
+        return None
+    return flight_number, date, status
+
+
+class PrefetchWorker:
+    """
+    Polls the watchlist for delayed or cancelled flights and warms the
+    details, stats and cancellation-reason caches for them before anyone
+    asks. All of its upstream calls run at prefetch priority, and a cycle
+    backs off whenever live requests are queued for quota.
+    """
+
+    def __init__(
+        self,
+        watchlist,
+        warm,
+        interval: float = PREFETCH_INTERVAL,
+        budget: int = PREFETCH_BUDGET,
+        max_polls: int = PREFETCH_MAX_POLLS,
+        concurrency: int = PREFETCH_CONCURRENCY,
+    ):
+        self.watchlist = watchlist
+        self.warm = warm
+        self.interval = interval
+        self.budget = budget
+        self.max_polls = max_polls
+        self.concurrency = concurrency
+        # (flight_number, date, status) already warmed; a new status warms again.
+        self._warmed = TTLCache(10000, WARMED_TTL)
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        # Every upstream call made from this task yields to live traffic.
+        request_priority.set(PRIORITY_PREFETCH)
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"[Prefetch Error] {e}")
+            await asyncio.sleep(self.interval)
+
+    def _live_traffic_waiting(self):
+        return any(s.stats()["queued"] for s in schedulers.values())
+
+    async def run_once(self):
+        """
+        Runs one poll-and-warm cycle and returns the number of flights warmed.
+        """
+        if self._live_traffic_waiting():
+            print("[Prefetch] Upstream queues are busy, skipping this cycle")
+            return 0
+
+        disruptions = await self.find_disruptions()
+        pending = [d for d in disruptions if self._warmed.get(d) is None]
+        pending = pending[: self.budget]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def warm_one(disruption):
+            flight_number, date, _ = disruption
+            async with semaphore:
+                if self._live_traffic_waiting():
+                    metrics.prefetch_flights.inc("deferred")
+                    return False
+                try:
+                    await self.warm(flight_number, date)
+                except Exception as e:
+                    print(f"[Prefetch Error] {flight_number} {date}: {e}")
+                    metrics.prefetch_flights.inc("error")
+                    return False
+            self._warmed.set(disruption, True)
+            metrics.prefetch_flights.inc("warmed")
+            return True
+
+        results = await asyncio.gather(*(warm_one(d) for d in pending))
+        return sum(results)
+
+    async def find_disruptions(self):
+        """
+        Returns (flight_number, date, status) for every disrupted flight on the
+        watchlist, spending at most max_polls AeroDataBox lookups.
+        """
+        polls = []
+        for kind, value in self.watchlist:
+            if kind == "airline":
+                flight_numbers = await self._airline_flights(value)
+                polls.extend(("flight", f) for f in flight_numbers)
+            else:
+                polls.append((kind, value))
+
+        disruptions = []
+        for kind, value in list(dict.fromkeys(polls))[: self.max_polls]:
+            try:
+                found = await self._poll(kind, value)
+            except Exception as e:
+                print(f"[Prefetch Error] {kind} {value}: {e}")
+                continue
+            disruptions.extend(d for d in found if d not in disruptions)
+        return disruptions
+
+    async def _poll(self, kind: str, value: str):
+        if kind == "airport":
+            board = await aerodatabox.fetch_departures(value)
+            return [d for d in map(_board_disruption, board) if d]
+        today = datetime.now(timezone.utc).date()
+        flights = await aerodatabox.fetch_flights_between(
+            value, str(today - timedelta(days=1)), str(today)
+        )
+        return [d for d in (_flight_disruption(value, f) for f in flights) if d]
+
+    async def _airline_flights(self, airline: str):
+        since = str(
+            datetime.now(timezone.utc).date() - timedelta(days=AIRLINE_LOOKBACK_DAYS)
+        )
+        return await flight_history.scan(
+            "DISTINCT flight_number",
+            "airline_iata = ? AND day >= ? ORDER BY flight_number",
+            (airline, since),
+            lambda cursor: [row[0] for row in cursor],
+        )
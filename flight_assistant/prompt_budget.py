@@ -0,0 +1,151 @@
+import html
+import math
+import os
+import re
+
+# Input token budgets for the variable parts of each prompt.
+POLICY_TOKEN_BUDGET = int(os.getenv("POLICY_TOKEN_BUDGET", "250"))
+SNIPPET_TOKEN_BUDGET = int(os.getenv("SNIPPET_TOKEN_BUDGET", "250"))
+
+# Texts are compared as sets of word SHINGLE_SIZE-grams. Two count as
+# duplicates when this share of the shorter one's shingles also appears in
+# the other, which catches reworded copies and truncated syndications.
+SHINGLE_SIZE = 3
+NEAR_DUPLICATE_OVERLAP = 0.6
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+_TAG = re.compile(r"<[^>]+>")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it of on or that the to was "
+    "were with this its after more than".split()
+)
+
+
+def estimate_tokens(text: str):
+    """
+    Approximate LLM token count: one per punctuation mark and roughly one per
+    four characters of each word, which tracks Llama-style BPE closely enough
+    for budgeting and reporting.
+    """
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _PIECE.findall(text))
+
+
+def _words(text: str):
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS}
+
+
+def normalize(text: str):
+    """
+    Lowercase words only, with HTML tags, entities and punctuation removed.
+    """
+    text = html.unescape(_TAG.sub(" ", text)).lower()
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE):
+    words = normalize(text).split()
+    if len(words) <= size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def _near_duplicate(a, b):
+    if not a or not b:
+        return False
+    return len(a & b) / min(len(a), len(b)) >= NEAR_DUPLICATE_OVERLAP
+
+
+def dedupe(texts):
+    """
+    Drops near-duplicates of a text already kept, keeping order. Of two
+    copies the longer one is kept, in the first's place.
+    """
+    kept, seen = [], []
+    for text in texts:
+        grams = shingles(text)
+        for i, other in enumerate(seen):
+            if _near_duplicate(grams, other):
+                if len(text) > len(kept[i]):
+                    kept[i], seen[i] = text, grams
+                break
+        else:
+            kept.append(text)
+            seen.append(grams)
+    return kept
+
+
+def rank_by_relevance(texts, query: str):
+    """
+    Orders texts by how many query words they contain. Ties keep the
+    original order, so callers can pass texts already in priority order.
+    """
+    terms = _words(query)
+    scored = [(-len(_words(t) & terms), i, t) for i, t in enumerate(texts)]
+    return [t for _, _, t in sorted(scored)]
+
+
+def fit_to_budget(texts, budget: int):
+    """
+    Keeps texts in order while they fit in budget tokens. A first text that
+    alone exceeds the budget is cut at a word boundary rather than dropped.
+    Returns (kept, dropped_tokens).
+    """
+    kept, used, dropped = [], 0, 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if used + tokens <= budget:
+            kept.append(text)
+            used += tokens
+        elif not kept:
+            words, cut = text.split(), []
+            for word in words:
+                if estimate_tokens(" ".join(cut + [word])) > budget:
+                    break
+                cut.append(word)
+            if cut:
+                kept.append(" ".join(cut) + " ...")
+                used = estimate_tokens(kept[0])
+            dropped += tokens - used
+        else:
+            dropped += tokens
+    return kept, dropped
+
+
+def budget_eligibility(eligibility, budget: int = POLICY_TOKEN_BUDGET):
+    """
+    Trims an eligibility result for the phrasing prompt. Clauses are taken in
+    priority order (eligible, conditional, not committed), skipping repeats
+    of a clause's text, while their text fits in budget. Returns (trimmed,
+    dropped_tokens).
+    """
+    sections = ("eligible", "conditional", "not_committed")
+    trimmed = {**eligibility, **{section: [] for section in sections}}
+    # Policy clauses about different benefits share most of their wording,
+    # so only exact repeats are dropped, not near-duplicates.
+    seen, used, dropped = set(), 0, 0
+    for section in sections:
+        for item in eligibility.get(section, []):
+            text = normalize(item["text"])
+            tokens = estimate_tokens(item["text"])
+            if text in seen or used + tokens > budget:
+                dropped += tokens
+                continue
+            seen.add(text)
+            used += tokens
+            trimmed[section].append(item)
+    return trimmed, dropped
+
+
+def select_snippets(snippets, query: str, budget: int = SNIPPET_TOKEN_BUDGET):
+    """
+    Deduplicates web snippets, ranks them by relevance to query and keeps
+    what fits in budget tokens. Returns (snippets, dropped_tokens).
+    """
+    unique = dedupe(snippets)
+    dropped = sum(estimate_tokens(s) for s in snippets) - sum(
+        estimate_tokens(s) for s in unique
+    )
+    kept, over_budget = fit_to_budget(rank_by_relevance(unique, query), budget)
+    return kept, dropped + over_budget
@@ -0,0 +1,155 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+# DOT treats a domestic delay of 3 hours or more as significant.
+SIGNIFICANT_DELAY_HOURS = 3.0
+
+# Flights leaving more than this many minutes late count as delayed, matching
+# the on-time cutoff used for the flight stats.
+DELAY_CUTOFF_MINUTES = 15
+
+BENEFIT_PATTERNS = [
+    ("cash", re.compile(r"^cash compensation", re.IGNORECASE)),
+    ("travel_credit", re.compile(r"credit/travel voucher", re.IGNORECASE)),
+    ("frequent_flyer_miles", re.compile(r"frequent flyer miles", re.IGNORECASE)),
+    ("meal", re.compile(r"^meal", re.IGNORECASE)),
+    ("hotel", re.compile(r"hotel accommodations", re.IGNORECASE)),
+    ("ground_transport", re.compile(r"ground transportation", re.IGNORECASE)),
+    ("rebook_partner", re.compile(r"^rebook on partner", re.IGNORECASE)),
+    ("rebook_same_airline", re.compile(r"^rebook passenger", re.IGNORECASE)),
+]
+
+THRESHOLD_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?)\s+hours?\s+or\s+more", re.IGNORECASE
+)
+
+TRIGGERS = {"cancellations": "cancellation", "delays": "delay"}
+
+
+@dataclass(frozen=True)
+class Rule:
+    benefit: str
+    trigger: str
+    committed: bool
+    text: str
+    threshold_hours: Optional[float] = None
+    overnight: bool = False
+    significant_delay: bool = False
+
+
+def parse_rule(text: str, policy_type: str, committed: bool):
+    benefit = next(
+        (name for name, pattern in BENEFIT_PATTERNS if pattern.search(text)), "other"
+    )
+    threshold = THRESHOLD_PATTERN.search(text)
+    lowered = text.lower()
+    return Rule(
+        benefit=benefit,
+        # The card the clause sits on decides when it applies, even where the
+        # scraped wording mentions the other disruption type.
+        trigger=TRIGGERS.get(policy_type, policy_type),
+        committed=committed,
+        text=text,
+        threshold_hours=float(threshold.group(1)) if threshold else None,
+        overnight="overnight" in lowered,
+        significant_delay="significant delay" in lowered,
+    )
+
+
+def parse_rules(policy_type: str, commits, does_not_commit):
+    return tuple(
+        [parse_rule(t, policy_type, True) for t in commits]
+        + [parse_rule(t, policy_type, False) for t in does_not_commit]
+    )
+
+
+def classify_disruption(status: str, delay_minutes):
+    if "cancel" in (status or "").lower():
+        return "cancellation"
+    if delay_minutes is not None and delay_minutes > DELAY_CUTOFF_MINUTES:
+        return "delay"
+    return None
+
+
+def _check(rule: Rule, delay_minutes, overnight):
+    """
+    Returns (eligible, condition): eligible is True/False, or None when it
+    depends on something the flight data cannot tell us.
+    """
+    if rule.overnight:
+        if overnight is None:
+            return None, f"if the {rule.trigger} is overnight"
+        return overnight, None
+
+    if rule.threshold_hours is not None:
+        # A cancellation's wait depends on the rebooked flight, which we don't know.
+        if rule.trigger == "cancellation" or delay_minutes is None:
+            return None, f"if the wait is {rule.threshold_hours:g} hours or more"
+        return delay_minutes >= rule.threshold_hours * 60, None
+
+    if rule.significant_delay:
+        if delay_minutes is None:
+            return None, "if the delay is significant"
+        return delay_minutes >= SIGNIFICANT_DELAY_HOURS * 60, None
+
+    return True, None
+
+
+def evaluate_eligibility(rules, status: str, delay_minutes=None, overnight=None):
+    """
+    Computes which committed benefits apply to a flight without calling the
+    LLM. Benefits the airline does not commit to are listed separately.
+    """
+    disruption = classify_disruption(status, delay_minutes)
+    result = {
+        "disruption": disruption,
+        "delay_minutes": delay_minutes,
+        "eligible": [],
+        "conditional": [],
+        "not_committed": [],
+    }
+    if disruption is None:
+        return result
+
+    for rule in rules:
+        if rule.trigger != disruption:
+            continue
+        if not rule.committed:
+            result["not_committed"].append(
+                {"benefit": rule.benefit, "text": rule.text}
+            )
+            continue
+        eligible, condition = _check(rule, delay_minutes, overnight)
+        if eligible is None:
+            result["conditional"].append(
+                {"benefit": rule.benefit, "text": rule.text, "condition": condition}
+            )
+        elif eligible:
+            result["eligible"].append({"benefit": rule.benefit, "text": rule.text})
+
+    return result
+
+
+def render_eligibility(eligibility):
+    if eligibility["disruption"] is None:
+        return "The flight is not cancelled or delayed."
+
+    lines = [f"Disruption: {eligibility['disruption']}"]
+    if eligibility["delay_minutes"] is not None:
+        lines.append(f"Departure delay: {eligibility['delay_minutes']} minutes")
+    sections = [
+        ("Eligible for", eligibility["eligible"], "text"),
+        ("Conditionally eligible for", eligibility["conditional"], None),
+        ("Airline does not commit to", eligibility["not_committed"], "text"),
+    ]
+    for title, items, field in sections:
+        if not items:
+            continue
+        lines.append(f"{title}:")
+        for item in items:
+            if field is None:
+                lines.append(f"- {item['text']} ({item['condition']})")
+            else:
+                lines.append(f"- {item[field]}")
+    return "\n".join(lines)
@@ -0,0 +1,182 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from datetime import datetime, timezone
+
+# Lower numbers are served first when a provider's quota is the bottleneck.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_PREFETCH = 2
+
+# Set by the endpoint (or background job) that triggers an upstream call.
+request_priority = contextvars.ContextVar(
+    "request_priority", default=PRIORITY_INTERACTIVE
+)
+
+# How long a call may wait in the queue before giving up, per priority.
+QUEUE_TIMEOUTS = {
+    PRIORITY_INTERACTIVE: float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "10")),
+    PRIORITY_BATCH: float(os.getenv("UPSTREAM_BATCH_QUEUE_TIMEOUT", "60")),
+    PRIORITY_PREFETCH: float(os.getenv("UPSTREAM_PREFETCH_QUEUE_TIMEOUT", "30")),
+}
+
+
+class UpstreamBusy(Exception):
+    """
+    Raised when a provider's quota cannot serve a call before its deadline.
+    """
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} is over its request quota, retry later")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class ProviderScheduler:
+    """
+    Admits calls to one provider through a token bucket. Calls that cannot go
+    out immediately wait in a priority queue until a token is free, their
+    deadline passes or the queue is full.
+    """
+
+    def __init__(self, name, rate, burst, max_queue, monthly_quota=None):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_queue = max_queue
+        self.monthly_quota = monthly_quota
+        self.paused_until = 0.0
+        self._month = None
+        self._month_calls = 0
+        self._queue = []
+        self._order = itertools.count()
+        self._dispatcher = None
+
+    def _check_monthly_quota(self):
+        if not self.monthly_quota:
+            return
+        month = datetime.now(timezone.utc).strftime("%Y-%m")
+        if month != self._month:
+            self._month, self._month_calls = month, 0
+        if self._month_calls >= self.monthly_quota:
+            raise UpstreamBusy(self.name, 3600)
+        self._month_calls += 1
+
+    def _ready(self):
+        return time.monotonic() >= self.paused_until and self.bucket.try_take()
+
+    async def acquire(self, priority: int = None):
+        if priority is None:
+            priority = request_priority.get()
+        if not self._queue and self._ready():
+            self._check_monthly_quota()
+            return
+
+        if len(self._queue) >= self.max_queue:
+            raise UpstreamBusy(self.name, self._retry_hint())
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._order), waiter))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        try:
+            await asyncio.wait_for(waiter, QUEUE_TIMEOUTS.get(priority, 10))
+        except asyncio.TimeoutError:
+            raise UpstreamBusy(self.name, self._retry_hint())
+        self._check_monthly_quota()
+
+    async def _dispatch(self):
+        while self._queue:
+            # Waiters whose deadline passed were cancelled by wait_for.
+            while self._queue and self._queue[0][2].done():
+                heapq.heappop(self._queue)
+            if not self._queue:
+                break
+            delay = max(self.paused_until - time.monotonic(), self.bucket.wait_time())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            if self.bucket.try_take():
+                _, _, waiter = heapq.heappop(self._queue)
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    def _retry_hint(self):
+        return max(
+            self.paused_until - time.monotonic(),
+            (len(self._queue) + 1) / self.bucket.rate,
+        )
+
+    def backoff(self, seconds: float):
+        """
+        Pauses the provider after a 429 so queued calls wait instead of
+        burning quota on certain rejections.
+        """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self):
+        return {
+            "queued": len(self._queue),
+            "tokens": round(self.bucket.tokens, 2),
+            "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            "month_calls": self._month_calls,
+        }
+
+
+def _provider_from_env(name: str, rate: str, burst: str):
+    prefix = name.upper()
+    monthly_quota = os.getenv(f"{prefix}_MONTHLY_QUOTA")
+    return ProviderScheduler(
+        name,
+        rate=float(os.getenv(f"{prefix}_RATE_LIMIT", rate)),
+        burst=float(os.getenv(f"{prefix}_BURST", burst)),
+        max_queue=int(os.getenv(f"{prefix}_MAX_QUEUE", "500")),
+        monthly_quota=int(monthly_quota) if monthly_quota else None,
+    )
+
+
+schedulers = {
+    "aerodatabox": _provider_from_env("aerodatabox", "10", "10"),
+    "brave": _provider_from_env("brave", "5", "5"),
+    "groq": _provider_from_env("groq", "5", "10"),
+}
+
+
+def retry_after_seconds(response, attempt: int):
+    """
+    Reads Retry-After (in seconds) from a 429, falling back to exponential
+    backoff when the header is missing or not numeric.
+    """
+    header = response.headers.get("Retry-After", "")
+    try:
+        return max(0.0, float(header))
+    except ValueError:
+        return min(30.0, 2.0**attempt)
@@ -0,0 +1,93 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller starts the
+    work and everyone who arrives while it is in flight awaits the same result.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # Shield the shared task so one disconnecting caller does not cancel it
+        # for everybody else.
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def in_flight(self):
+        return len(self._calls)
+
+
+class SharedStream:
+    """
+    Reads an async iterator once and replays its chunks to any number of
+    subscribers, including ones that join after streaming has started.
+    """
+
+    def __init__(self, source):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._wakeup = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    async def subscribe(self):
+        position = 0
+        while True:
+            wakeup = self._wakeup
+            while position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await wakeup.wait()
+
+
+class StreamGroup:
+    """
+    Fans one upstream stream out to every concurrent subscriber with the same key.
+    """
+
+    def __init__(self):
+        self._streams = {}
+
+    def subscribe(self, key, factory):
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = self._streams[key] = SharedStream(factory())
+            shared.task.add_done_callback(lambda _: self._forget(key, shared))
+        return shared.subscribe()
+
+    def _forget(self, key, shared):
+        if self._streams.get(key) is shared:
+            del self._streams[key]
+
+    def in_flight(self):
+        return len(self._streams)
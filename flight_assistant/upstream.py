@@ -0,0 +1,115 @@
+import os
+import httpx
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+from flight_assistant import metrics
+from flight_assistant.scheduler import UpstreamBusy, retry_after_seconds, schedulers
+
+load_dotenv()
+
+RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY")
+RAPIDAPI_HOST = "aerodatabox.p.rapidapi.com"
+BRAVE_API_KEY = os.getenv("BRAVE_API_KEY")
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+
+MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "30"))
+# Retries after a 429 before the caller sees UpstreamBusy.
+MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+
+
+
+class UpstreamError(Exception):
+    """
+    Raised when a provider fails a call with a server error, as opposed to
+    rejecting what was asked of it.
+    """
+
+
+# One pooled keep-alive client per upstream host, shared by every request.
+_clients = {}
+
+
+def _client_headers(name: str):
+    if name == "aerodatabox":
+        return {"x-rapidapi-key": RAPIDAPI_KEY or "", "x-rapidapi-host": RAPIDAPI_HOST}
+    if name == "brave":
+        return {"Accept": "application/json", "X-Subscription-Token": BRAVE_API_KEY or ""}
+    if name == "groq":
+        return {
+            "Authorization": f"Bearer {GROQ_API_KEY}",
+            "Content-Type": "application/json",
+        }
+    raise ValueError(f"Unknown upstream: {name}")
+
+
+def _new_client(name: str):
+    return httpx.AsyncClient(
+        headers=_client_headers(name),
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE
+        ),
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+    )
+
+
+async def start_clients():
+    """
+    Opens the pooled clients. Called once from the FastAPI lifespan on startup.
+    """
+    for name in ("aerodatabox", "brave", "groq"):
+        if name not in _clients:
+            _clients[name] = _new_client(name)
+
+
+async def close_clients():
+    """
+    Closes every pooled client and drops its keep-alive connections.
+    """
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def get_client(name: str):
+    # Lazily create the client so scripts that never run the lifespan still work.
+    client = _clients.get(name)
+    if client is None:
+        client = _clients[name] = _new_client(name)
+    return client
+
+
+async def request(name: str, method: str, url: str, **kwargs):
+    """
+    Sends a request once the provider's scheduler admits it, backing off and
+    retrying when the provider answers 429.
+    """
+    scheduler = schedulers[name]
+    for attempt in range(MAX_RETRIES + 1):
+        await scheduler.acquire()
+        with metrics.track_upstream(name):
+            response = await get_client(name).request(method, url, **kwargs)
+        if response.status_code != 429:
+            return response
+        delay = retry_after_seconds(response, attempt)
+        scheduler.backoff(delay)
+    raise UpstreamBusy(name, delay)
+
+
+@asynccontextmanager
+async def stream(name: str, method: str, url: str, **kwargs):
+    scheduler = schedulers[name]
+    for attempt in range(MAX_RETRIES + 1):
+        await scheduler.acquire()
+        with metrics.track_upstream(name):
+            async with get_client(name).stream(method, url, **kwargs) as response:
+                if response.status_code != 429:
+                    yield response
+                    return
+                delay = retry_after_seconds(response, attempt)
+        scheduler.backoff(delay)
+    raise UpstreamBusy(name, delay)
@@ -0,0 +1,130 @@
+import asyncio
+import os
+from datetime import date as date_type
+
+import httpx
+
+from flight_assistant import metrics, upstream
+from flight_assistant.cache_backends import SharedCache
+from flight_assistant.prompt_budget import dedupe
+from flight_assistant.scheduler import UpstreamBusy
+
+BRAVE_API_URL = os.getenv(
+    "BRAVE_API_URL", "https://api.search.brave.com/res/v1/web/search"
+)
+WEB_SEARCH_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "5"))
+SEARCH_RESULTS = 5
+# Snippet sets are shared by every flight of an airline on a day. Past days'
+# coverage rarely changes, so they are kept longer than today's.
+WEB_CONTEXT_TTL = float(os.getenv("WEB_CONTEXT_TTL", "900"))
+WEB_CONTEXT_PAST_TTL = float(os.getenv("WEB_CONTEXT_PAST_TTL", "21600"))
+
+DISRUPTIONS = ("cancellation", "delay")
+
+context_cache = SharedCache("web_context", WEB_CONTEXT_TTL)
+
+
+def merge_snippets(snippet_lists):
+    """
+    Flattens snippet lists in order, dropping near-duplicates with the same
+    dedupe the prompt budget applies.
+    """
+    return dedupe([snippet for snippets in snippet_lists for snippet in snippets])
+
+
+def disruptions_for(flight_details, flight_stats):
+    """
+    The disruption types worth searching for: the flight was cancelled, or
+    it has been delayed in its recent history.
+    """
+    found = []
+    if "cancel" in flight_details["status"].lower():
+        found.append("cancellation")
+    if flight_stats.get("delayed", 0) > 0:
+        found.append("delay")
+    return found
+
+
+def search_query(airline_name: str, date: str, disruption: str):
+    return f"{airline_name} flight {disruption} reason {date}"
+
+
+def extract_brave_snippets(brave_response, max_snippets=SEARCH_RESULTS):
+    try:
+        results = brave_response.get("web", {}).get("results", [])
+        snippets = [r["description"] for r in results if "description" in r]
+        return snippets[:max_snippets]
+    except Exception as e:
+        print(f"Error parsing Brave results: {e}")
+        return []
+
+
+async def query_brave_search(query: str, count: int = SEARCH_RESULTS):
+    """
+    Returns the Brave response, or None when the search failed or timed out.
+    """
+    params = {"q": query, "count": count}
+    try:
+        with metrics.span("query_brave_search"):
+            response = await asyncio.wait_for(
+                upstream.request("brave", "GET", BRAVE_API_URL, params=params),
+                WEB_SEARCH_TIMEOUT,
+            )
+        response.raise_for_status()
+        return response.json()
+    except asyncio.TimeoutError:
+        print(f"[Brave Search Timeout] {query}")
+    except (httpx.HTTPError, UpstreamBusy) as e:
+        print(f"[Brave Search Error] {e}")
+    return None
+
+
+def _ttl(date: str):
+    try:
+        past = date_type.fromisoformat(date) < date_type.today()
+    except ValueError:
+        past = False
+    return WEB_CONTEXT_PAST_TTL if past else WEB_CONTEXT_TTL
+
+
+async def _load_context(airline_name: str, date: str, disruption: str):
+    brave_response = await query_brave_search(
+        search_query(airline_name, date, disruption)
+    )
+    # A failed search is not cached, so the next request tries again; an
+    # empty but successful one is.
+    if brave_response is None:
+        return None
+    return {"snippets": merge_snippets([extract_brave_snippets(brave_response)])}
+
+
+async def airline_day_snippets(airline: str, airline_name: str, date, disruption):
+    """
+    The deduplicated snippets about one airline's disruptions of one type on
+    one day. Concurrent and later callers share one search per key, across
+    workers when a shared cache backend is configured.
+    """
+    entry = await context_cache.get_or_set(
+        (airline, date, disruption),
+        lambda: _load_context(airline_name, date, disruption),
+        ttl=_ttl(date),
+    )
+    return entry["snippets"] if entry else []
+
+
+async def gather_snippets(flight_details, date: str, disruptions):
+    """
+    Merged snippets for the flight's airline and day across the given
+    disruption types. All searches run at once; a slow or failing search
+    only costs its snippets.
+    """
+    airline = flight_details["airline_iata"] or flight_details["flight_name"]
+    results = await asyncio.gather(
+        *(
+            airline_day_snippets(
+                airline.upper(), flight_details["flight_name"], date, disruption
+            )
+            for disruption in disruptions
+        )
+    )
+    return merge_snippets(results)
@@ -1,17 +1,54 @@
 import requests
+import hashlib
 import json
+import os
 import re
+import sys
+import time
 from bs4 import BeautifulSoup
 
 URL = "https://www.transportation.gov/resources/individuals/aviation-consumer-protection/airline-cancellation-delay-dashboard-html"
+POLICIES_PATH = "data/airline_policies.json"
+# Validators from the last download, so unchanged pages are not re-fetched or re-parsed.
+META_PATH = "data/airline_policies.meta.json"
+# A scrape that drops more than this share of the known airlines most likely means the
+# page layout changed, so it is not saved without --force.
+MAX_REMOVED_SHARE = 0.5
 
-def fetch_page(url=URL):
+def load_meta(path=META_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def fetch_page_if_changed(meta, url=URL):
     """
-    Downloads the webpage content from the given URL.
+    Conditional GET using the stored ETag/Last-Modified. Returns (html, new_meta),
+    or (None, meta) when the page has not changed since the last run.
     """
-    response = requests.get(url)
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    response = requests.get(url, headers=headers)
+    if response.status_code == 304:
+        return None, meta
     response.raise_for_status()
-    return response.text
+
+    content_hash = hashlib.sha256(response.content).hexdigest()
+    new_meta = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": content_hash,
+        "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    # Some servers ignore validators; an identical body still skips parsing.
+    if content_hash == meta.get("sha256"):
+        return None, new_meta
+    return response.text, new_meta
 
 def parse_cards(html):
     """
@@ -60,15 +97,104 @@ def parse_cards(html):
     
     return results
 
-def scrape_and_save():
+def _by_airline(cards):
+    grouped = {}
+    for card in cards:
+        policy = grouped.setdefault(card["airline"], {})
+        policy[card["policy_type"]] = card
+    return grouped
+
+def _list_diff(old, new):
+    return {
+        "added": [item for item in new if item not in old],
+        "removed": [item for item in old if item not in new],
+    }
+
+def diff_policies(old_cards, new_cards):
+    """
+    Compares two scrapes airline by airline. Returns {airline: change} where change
+    is "added", "removed" or {policy_type: {"commits": {...}, "does_not_commit": {...}}}
+    listing the added and removed items. Unchanged airlines are left out.
+    """
+    old, new = _by_airline(old_cards), _by_airline(new_cards)
+    diff = {}
+    for airline in sorted(set(old) | set(new)):
+        if airline not in old:
+            diff[airline] = "added"
+        elif airline not in new:
+            diff[airline] = "removed"
+        elif old[airline] != new[airline]:
+            changes = {}
+            for policy_type in sorted(set(old[airline]) | set(new[airline])):
+                before = old[airline].get(policy_type, {})
+                after = new[airline].get(policy_type, {})
+                if before == after:
+                    continue
+                changes[policy_type] = {
+                    field: _list_diff(before.get(field, []), after.get(field, []))
+                    for field in ("commits", "does_not_commit")
+                }
+            diff[airline] = changes
+    return diff
+
+def _write_json(path, data):
+    # Write then rename, so the API's reload never sees a half-written file.
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _load_cards(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def scrape_and_save(force=False):
     """
     Combines the fetching and parsing of the webpage then saves the structured data to airline_policies.json.
+    Skips parsing when the page is unchanged and only rewrites the file when some airline changed.
+    An empty scrape, or one removing most airlines, is refused unless force is set.
+    Returns the per-airline diff.
     """
-    html = fetch_page()
+    meta = {} if force else load_meta()
+    html, new_meta = fetch_page_if_changed(meta)
+    if html is None:
+        _write_json(META_PATH, new_meta)
+        print("Policy page unchanged, nothing to do.")
+        return {}
+
+    old_cards = _load_cards(POLICIES_PATH)
     data = parse_cards(html)
-    with open("data/airline_policies.json", "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-    print("Scraping complete. Data saved to airline_policies.json")
+    diff = diff_policies(old_cards, data)
+    removed = sum(1 for change in diff.values() if change == "removed")
+    known = len(_by_airline(old_cards))
+    if not force and (not data or (known and removed / known > MAX_REMOVED_SHARE)):
+        print(
+            f"Refusing to save: scrape found {len(_by_airline(data))} airlines and "
+            f"removes {removed} of {known}. Check the page layout or rerun with --force."
+        )
+        return {}
+    if diff:
+        _write_json(POLICIES_PATH, data)
+    _write_json(META_PATH, new_meta)
+
+    if not diff:
+        print("Page changed but no airline policy did.")
+    for airline, change in diff.items():
+        if isinstance(change, str):
+            print(f"{airline}: {change}")
+            continue
+        for policy_type, fields in change.items():
+            for field, items in fields.items():
+                for item in items["added"]:
+                    print(f"{airline} [{policy_type}] {field} + {item}")
+                for item in items["removed"]:
+                    print(f"{airline} [{policy_type}] {field} - {item}")
+    if diff:
+        print("Scraping complete. Data saved to airline_policies.json")
+    return diff
 
 if __name__ == "__main__":
-    scrape_and_save()
\ No newline at end of file
+    scrape_and_save(force="--force" in sys.argv[1:])
\ No newline at end of file
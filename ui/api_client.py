@@ -0,0 +1,180 @@
+import codecs
+import json
+import os
+import time
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+API_URL = os.getenv("SKYSETTLE_API_URL", "http://localhost:8000")
+
+# Streamed answers are redrawn at most this often (seconds), or sooner once
+# this many new characters have arrived.
+RENDER_INTERVAL = float(os.getenv("UI_RENDER_INTERVAL", "0.1"))
+RENDER_CHARS = int(os.getenv("UI_RENDER_CHARS", "200"))
+READ_CHUNK_BYTES = 1024
+STATS_TTL = 300
+
+
+class ApiError(Exception):
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"API Error {status_code}: {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+@st.cache_resource
+def get_session():
+    """
+    One keep-alive session shared by every rerun and browser tab.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def stream_text(path: str, params):
+    """
+    Yields decoded text as it arrives. Reads in blocks and decodes
+    incrementally, so multi-byte characters split across reads stay intact.
+    """
+    with get_session().get(f"{API_URL}{path}", params=params, stream=True) as r:
+        if r.status_code != 200:
+            raise ApiError(r.status_code, r.text)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # chunk_size=None hands over whatever the server has flushed so far.
+        for block in r.iter_content(chunk_size=None):
+            text = decoder.decode(block)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+class AnswerRenderer:
+    """
+    Shows a streamed answer in placeholder, redrawing on a timer or after
+    RENDER_CHARS new characters instead of on every chunk.
+    """
+
+    def __init__(self, placeholder, title: str):
+        self.placeholder = placeholder
+        self.title = title
+        self.parts = []
+        self.pending = 0
+        self.last_render = time.monotonic()
+
+    def add(self, chunk: str):
+        self.parts.append(chunk)
+        self.pending += len(chunk)
+        now = time.monotonic()
+        if self.pending >= RENDER_CHARS or now - self.last_render >= RENDER_INTERVAL:
+            text = "".join(self.parts)
+            self.placeholder.markdown(f"### {self.title}\n" + text + "▌")
+            self.pending, self.last_render = 0, now
+
+    def finish(self):
+        text = "".join(self.parts).strip()
+        self.placeholder.markdown(f"### {self.title}\n" + text)
+        return text
+
+
+def render_stream(placeholder, chunks, title: str):
+    """
+    Renders chunks with an AnswerRenderer and returns the full text.
+    """
+    renderer = AnswerRenderer(placeholder, title)
+    for chunk in chunks:
+        renderer.add(chunk)
+    return renderer.finish()
+
+
+def stream_events(path: str, params):
+    """
+    Yields (event, data) pairs from a server-sent event stream whose data
+    lines are JSON.
+    """
+    buffer = ""
+    event, data = "message", []
+    for text in stream_text(path, params):
+        buffer += text
+        while "\n" in buffer:
+            line, buffer = buffer.split("\n", 1)
+            if not line:
+                if data:
+                    yield event, json.loads("\n".join(data))
+                event, data = "message", []
+            elif line.startswith("event:"):
+                event = line[len("event:") :].strip()
+            elif line.startswith("data:"):
+                data.append(line[len("data:") :].strip())
+
+
+@st.cache_data(ttl=STATS_TTL, show_spinner=False)
+def fetch_flight_stats(flight_number: str, date: str):
+    response = get_session().get(
+        f"{API_URL}/flight-stats",
+        params={"flight_number": flight_number, "date": date},
+    )
+    if response.status_code != 200:
+        raise ApiError(response.status_code, response.text)
+    return response.json()
+
+
+def _answers(kind: str):
+    return st.session_state.setdefault(f"{kind}_answers", {})
+
+
+def cached_answer(kind: str, flight_number: str, date: str):
+    """
+    A previously fetched answer ("compensation", "reason" or "stats") for
+    this flight and date in the current session, or None.
+    """
+    return _answers(kind).get((flight_number.upper(), date))
+
+
+def stream_answer(kind, path, flight_number, date, placeholder, title):
+    """
+    Streams an answer into placeholder and keeps it for the session, so
+    reruns and repeat clicks don't call the API again.
+    """
+    params = {"flight_number": flight_number, "date": date}
+    text = render_stream(placeholder, stream_text(path, params), title)
+    _answers(kind)[(flight_number.upper(), date)] = text
+    return text
+
+
+def stream_report(flight_number, date, placeholders):
+    """
+    Streams /flight-report in one request: details, the compensation answer
+    and the cancellation reason are drawn into placeholders ("details",
+    "compensation", "reason") as they arrive. Answers and stats are kept for
+    the session. Returns the flight details.
+    """
+    params = {"flight_number": flight_number, "date": date}
+    key = (flight_number.upper(), date)
+    renderers = {
+        "compensation": AnswerRenderer(placeholders["compensation"], "💬 LLM Answer"),
+        "reason": AnswerRenderer(placeholders["reason"], "Cancellation Reason"),
+    }
+    details = {}
+    for event, data in stream_events("/flight-report", params):
+        if event == "details":
+            details = data
+            with placeholders["details"].container():
+                st.markdown("### ✈️ Flight Details")
+                st.json(details)
+        elif event == "stats":
+            _answers("stats")[key] = data
+        elif event in renderers:
+            renderers[event].add(data["text"])
+        elif event == "end":
+            _answers(data["part"])[key] = renderers[data["part"]].finish()
+        elif event == "error":
+            if data["part"] in renderers:
+                placeholders[data["part"]].error(data["error"])
+    return details
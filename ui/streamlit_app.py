@@ -1,7 +1,14 @@
 import streamlit as st
-import requests
 from datetime import date
 
+from api_client import (
+    ApiError,
+    cached_answer,
+    fetch_flight_stats,
+    stream_answer,
+    stream_report,
+)
+
 st.title("Airline Compensation Claim Assistant")
 st.write(
     "Enter the flight number and flight date to check eligibility for compensation or benefits."
@@ -35,29 +42,31 @@ if st.button("Submit"):
     if not flight_number:
         st.error("Please enter a flight number.")
     else:
-        api_url = f"http://localhost:8000/compensation?flight_number={flight_number}&date={date_str}"
+        # Asking again for the same flight and date reuses the earlier answer.
+        answer = cached_answer("compensation", flight_number, date_str)
+        if answer is not None:
+            st.session_state.compensation_fetched = True
+            st.session_state.output_text = answer
+            st.session_state.flight_details = {}
+            st.rerun()
+
         st.info("Sending request to the API...")
         try:
-            with requests.get(api_url, stream=True) as response:
-                if response.status_code == 200:
-                    st.session_state.compensation_fetched = True
-                    st.session_state.output_text = ""
-                    st.session_state.flight_details = {}
-
-                    placeholder = st.empty()
-                    streamed_text = ""
-
-                    for chunk in response.iter_content(
-                        chunk_size=1, decode_unicode=True
-                    ):
-                        streamed_text += chunk
-                        placeholder.markdown(
-                            "### 💬 LLM Answer\n" + streamed_text + "▌"
-                        )
-
-                    st.session_state.output_text = streamed_text.strip()
-                else:
-                    st.error(f"API Error {response.status_code}: {response.text}")
+            # One request brings the details, stats and both answers, so the
+            # buttons below can show them without calling the API again.
+            placeholders = {
+                "details": st.empty(),
+                "compensation": st.empty(),
+                "reason": st.empty(),
+            }
+            details = stream_report(flight_number, date_str, placeholders)
+            st.session_state.compensation_fetched = True
+            st.session_state.output_text = (
+                cached_answer("compensation", flight_number, date_str) or ""
+            )
+            st.session_state.flight_details = details
+        except ApiError as e:
+            st.error(str(e))
         except Exception as e:
             st.error(f"An error occurred: {e}")
 
@@ -68,18 +77,16 @@ if st.session_state.compensation_fetched:
         st.session_state.show_history = False
 
     if st.button("Show Flight History for Last 7 Days"):
-        stats_url = f"http://localhost:8000/flight-stats?flight_number={flight_number}&date={date_str}"
-        st.info("Fetching flight stats...")
         try:
-            stats_response = requests.get(stats_url)
-            if stats_response.status_code == 200:
-                stats = stats_response.json()
-                st.session_state.show_history = True
-                st.session_state.flight_stats = stats
-            else:
-                st.error(
-                    f"Flight stats error {stats_response.status_code}: {stats_response.text}"
-                )
+            # Usually already here from the report; otherwise cached per
+            # (flight, date) across reruns and sessions.
+            stats = cached_answer("stats", flight_number, date_str)
+            if stats is None:
+                stats = fetch_flight_stats(flight_number.upper(), date_str)
+            st.session_state.show_history = True
+            st.session_state.flight_stats = stats
+        except ApiError as e:
+            st.error(f"Flight stats error {e.status_code}: {e.text}")
         except Exception as e:
             st.error(f"An error occurred: {e}")
 
@@ -96,27 +103,23 @@ if st.session_state.compensation_fetched:
 
 
 if st.button("Why was this flight cancelled or delayed?"):
-    cancel_url = f"http://localhost:8000/cancellation-reason?flight_number={flight_number}&date={date_str}"
     try:
-        with requests.get(cancel_url, stream=True) as cancel_response:
-            if cancel_response.status_code == 200:
-                streamed_reason = ""
-                placeholder = st.empty()
-
-                for chunk in cancel_response.iter_content(
-                    chunk_size=1, decode_unicode=True
-                ):
-                    streamed_reason += chunk
-                    placeholder.markdown(
-                        "### Cancellation Reason\n" + streamed_reason + "▌"
-                    )
-
-                st.session_state.cancellation_reason = streamed_reason.strip()
-            else:
-                st.session_state.cancellation_reason = (
-                    f"Error {cancel_response.status_code}: {cancel_response.text}"
-                )
-
+        reason = cached_answer("reason", flight_number, date_str)
+        if reason is None:
+            placeholder = st.empty()
+            reason = stream_answer(
+                "reason",
+                "/cancellation-reason",
+                flight_number,
+                date_str,
+                placeholder,
+                "Cancellation Reason",
+            )
+            # The final answer is shown below, once.
+            placeholder.empty()
+        st.session_state.cancellation_reason = reason
+    except ApiError as e:
+        st.session_state.cancellation_reason = f"Error {e.status_code}: {e.text}"
     except Exception as e:
         st.session_state.cancellation_reason = (
             f"Error fetching cancellation reason: {e}"